@@ -0,0 +1,202 @@
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from synthetic import generate
+
+__author__ = 'tbsexton'
+"""
+HashStream's benchmark harness. Generates synthetic tweet files (see
+synthetic.py) at several sizes, and times each stage of the pipeline on them:
+
+    extract         Preprocess.extract(), parsing the file
+    rolled_graph    iterating over rolled_graph_gen()
+    g_stats         g_stats() of mean_deg() over rolled_window_gen(), as in main.py
+    mean_deg        mean_deg() alone, on each graph of rolled_graph_gen()
+
+Each stage runs in a fresh interpreter, so its peak RSS is its own. The cold
+start of src/main.py on a handful of tweets (interpreter plus imports) is
+timed too, along with which heavy dependencies it loaded. Results are written
+as JSON (one record per size and stage, plus how each stage scales with size,
+and the cold start) to compare against later runs and catch regressions.
+
+Call in terminal from root like:
+    $ python benchmarks/bench.py --sizes 1000 10000 100000 --out bench.json
+"""
+
+
+STAGES = ['extract', 'rolled_graph', 'g_stats', 'mean_deg']
+HEAVY = ['pandas', 'networkx', 'scipy', 'matplotlib']  # slow to import
+_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+sys.path.insert(0, _SRC)
+
+
+def _quiet():
+    """Silence the prints and progress bars of the stage being timed."""
+    devnull = open(os.devnull, 'w')
+    sys.stdout, sys.stderr = devnull, devnull
+
+
+def _rss_kb():
+    """Peak resident set size of this process so far, in KB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss  # bytes on OS X
+
+
+def run_stage(stage, fname, window=60.):
+    """
+    Time one stage on a tweet file, in this process.
+
+    Returns
+    -------
+    dict
+        seconds taken, the number of tweets (or graphs, for mean_deg) it went
+        through, and peak RSS before and after.
+    """
+    from preprocess import Preprocess
+    from analysis import rolled_graph_gen, rolled_window_gen, g_stats, mean_deg
+
+    out = sys.stdout
+    _quiet()
+    pre = Preprocess(fname)
+    if stage == 'extract':
+        rss = _rss_kb()
+        t = time.time()
+        pre.extract()
+        secs = time.time() - t
+        items = pre.no_saved_tweets
+    else:
+        pre.extract()
+        store = pre.store
+        items = len(store)
+        rss = _rss_kb()
+        t = time.time()
+        if stage == 'rolled_graph':
+            for _ in rolled_graph_gen(store, window=window):
+                pass
+        elif stage == 'g_stats':
+            g_stats(rolled_window_gen(store, window=window), mean_deg)
+        elif stage == 'mean_deg':  # only count the time spent inside mean_deg()
+            t, items = 0., 0
+            for g in rolled_graph_gen(store, window=window, copy=False):
+                t0 = time.time()
+                mean_deg(g)
+                t += time.time() - t0
+                items += 1
+        else:
+            raise ValueError('unknown stage: {!r}'.format(stage))
+        secs = t if stage == 'mean_deg' else time.time() - t
+
+    sys.stdout = out
+    return {'seconds': secs, 'items': items, 'base_rss_kb': rss, 'peak_rss_kb': _rss_kb()}
+
+
+def cold_start(workdir, repeat=5):
+    """
+    Best wall time (of [repeat] runs) of `python src/main.py` on a few tweets,
+    and the heavy modules such a run imports.
+    """
+    fname = os.path.join(workdir, 'tweets_cold.txt')
+    generate(fname, 20)
+    main = os.path.join(_SRC, 'main.py')
+    cmd = [sys.executable, main, '-q', fname, fname + '.out']
+    best = float('inf')
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(repeat):
+            t = time.time()
+            subprocess.check_call(cmd, stdout=devnull)
+            best = min(best, time.time() - t)
+
+    probe = ('import sys; sys.argv = {!r}; sys.path.insert(0, {!r}); import main; '
+             'main.main(sys.argv[1:]); print(" ".join(m for m in {!r} if m in sys.modules))'
+             ).format(cmd[1:], _SRC, HEAVY)
+    loaded = subprocess.check_output([sys.executable, '-c', probe]).split('\n')[-2].split()
+    for f in (fname, fname + '.out'):
+        os.remove(f)
+    return {'seconds': best, 'heavy_modules': loaded}
+
+
+def _scaling(results, stage):
+    """Exponent k of a power law fit, seconds ~ size^k, for one stage."""
+    pts = [(r['tweets'], r['seconds']) for r in results
+           if r['stage'] == stage and r['tweets'] > 0 and r['seconds'] > 0]
+    if len(pts) < 2:
+        return None
+    x, y = np.log(np.array(pts, dtype=float)).T
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def bench(sizes, stages=STAGES, window=60., workdir=None, **gen_kwargs):
+    """
+    Benchmark each stage at each size (number of lines generated).
+
+    Returns
+    -------
+    dict
+        'meta' (python, platform, parameters), 'startup' (see cold_start()),
+        'results' (a record per size and stage), and 'scaling' (power law
+        exponent of each stage's time).
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix='hashstream-bench-')
+    startup = cold_start(workdir)
+    print 'cold start {:.3f} s, loading: {}'.format(
+        startup['seconds'], ', '.join(startup['heavy_modules']) or 'no heavy modules')
+    results = []
+    for size in sizes:
+        fname = os.path.join(workdir, 'tweets_{:d}.txt'.format(size))
+        no_tweets = generate(fname, size, **gen_kwargs)
+        for stage in stages:
+            cmd = [sys.executable, os.path.abspath(__file__), '--stage', stage,
+                   '--file', fname, '--window', repr(window)]
+            rec = json.loads(subprocess.check_output(cmd))
+            rec.update(stage=stage, lines=size, tweets=no_tweets,
+                       file_bytes=os.path.getsize(fname),
+                       per_sec=rec['items'] / rec['seconds'] if rec['seconds'] else None)
+            results.append(rec)
+            print '{:>8d} lines  {:<13s}{:8.3f} s  {:>12.0f} /s  {:>8d} KB peak'.format(
+                size, stage, rec['seconds'], rec['per_sec'] or 0, rec['peak_rss_kb'])
+        os.remove(fname)
+
+    meta = {'python': platform.python_version(), 'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'window': window, 'sizes': list(sizes), 'generator': gen_kwargs}
+    return {'meta': meta, 'startup': startup, 'results': results,
+            'scaling': dict((s, _scaling(results, s)) for s in stages)}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark HashStream on synthetic tweets.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--window', type=float, default=60.)
+    parser.add_argument('--out', help='file to write the JSON results to')
+    parser.add_argument('--rate', type=float, default=10.)
+    parser.add_argument('--n-tags', type=int, default=10000)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--late', type=float, default=.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stage', help=argparse.SUPPRESS)  # run a single stage
+    parser.add_argument('--file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        json.dump(run_stage(args.stage, args.file, args.window), sys.stdout)
+        sys.exit()
+
+    report = bench(args.sizes, args.stages, args.window, rate=args.rate,
+                   n_tags=args.n_tags, zipf=args.zipf, late=args.late, seed=args.seed)
+    print 'Scaling exponents (time ~ size^k): ' + ', '.join(
+        '{}={:.2f}'.format(s, k) for s, k in sorted(report['scaling'].items()) if k is not None)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print 'saving to ' + args.out
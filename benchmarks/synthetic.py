@@ -0,0 +1,121 @@
+import json
+import time
+import numpy as np
+
+__author__ = 'tbsexton'
+"""
+Synthetic tweet stream generator, for benchmarking HashStream at any scale.
+
+Writes newline-delimited JSON in the layout of the Twitter streaming API, with
+a tunable tweet rate, Zipfian hashtag popularity, distribution of hashtags per
+tweet, share of rate-limit messages and malformed tweets (lacking the keys
+HashStream needs), and share of tweets that show up late (out of order).
+
+Call in terminal from root like:
+    $ python benchmarks/synthetic.py /path/to/tweets.txt 100000
+"""
+
+
+__all__ = ['generate']
+
+_EPOCH = 1458841870  # Thu Mar 24 17:51:10 +0000 2016
+_TAGS_PER_TWEET = (.45, .25, .15, .08, .04, .03)  # P(0), P(1), ... hashtags
+
+
+def _tweet(i, epoch, tags):
+    """JSON line of a tweet, with the keys HashStream looks at up front."""
+    created_at = time.strftime('%a %b %d %H:%M:%S +0000 %Y', time.gmtime(epoch))
+    text = u' '.join([u'just a synthetic tweet'] + [u'#' + t for t in tags])
+    hashtags = [{"text": t, "indices": [0, len(t) + 1]} for t in tags]
+    return ('{"created_at":"%s","id":%d,"id_str":"%d","text":%s,'
+            '"user":{"id":%d,"screen_name":"user%d","lang":"en"},'
+            '"entities":{"hashtags":%s,"urls":[],"user_mentions":[]},'
+            '"lang":"en","timestamp_ms":"%d000"}'
+            % (created_at, i, i, json.dumps(text), i % 997, i % 997,
+               json.dumps(hashtags, separators=(',', ':')), epoch))
+
+
+def generate(fname, n, rate=10., n_tags=10000, zipf=1.1, tags_per_tweet=_TAGS_PER_TWEET,
+             limit=.03, malformed=.01, late=.05, max_delay=90., seed=0):
+    """
+    Writes a file of synthetic tweets.
+
+    Parameters
+    ----------
+    fname : str
+        name of the file to write (with path).
+    n : int
+        number of lines to write, including rate-limit and malformed lines.
+    rate : float
+        mean tweets per sec (arrivals are Poisson).
+    n_tags : int
+        number of distinct hashtags.
+    zipf : float
+        exponent s of hashtag popularity, P(k-th most popular) ~ 1/k^s.
+    tags_per_tweet : sequence of floats
+        probability of a tweet having 0, 1, 2, ... hashtags.
+    limit, malformed : float
+        share of lines that are rate-limit messages, or tweets without an
+        'entities' object (both are dropped by Preprocess).
+    late : float
+        share of tweets that arrive late, i.e. with a timestamp up to
+        [max_delay] sec before the latest one.
+    seed : int
+        random seed, so the same arguments always write the same file.
+
+    Returns
+    -------
+    int
+        number of well-formed tweets written.
+    """
+    rs = np.random.RandomState(seed)
+    popularity = 1. / np.arange(1, n_tags + 1) ** zipf
+    vocab = [u'tag%d' % k for k in range(n_tags)]
+
+    kind = rs.random_sample(n)
+    epochs = _EPOCH + np.cumsum(rs.exponential(1. / rate, n))
+    delays = np.where(rs.random_sample(n) < late, rs.uniform(0, max_delay, n), 0.)
+    epochs = (epochs - delays).astype(np.int64)
+
+    p = np.asarray(tags_per_tweet, dtype=float)
+    counts = rs.choice(len(p), size=n, p=p / p.sum())
+    tag_ids = rs.choice(n_tags, size=counts.sum(), p=popularity / popularity.sum())
+    ends = np.cumsum(counts)
+
+    tweets = 0
+    with open(fname, 'wb') as f:
+        for i in xrange(n):
+            if kind[i] < limit:
+                line = '{"limit":{"track":%d,"timestamp_ms":"%d000"}}' % (i, epochs[i])
+            else:
+                tags = [vocab[k] for k in tag_ids[ends[i] - counts[i]:ends[i]]]
+                line = _tweet(i, epochs[i], tags)
+                if kind[i] < limit + malformed:
+                    line = line.replace('"entities":', '"entitles":')
+                else:
+                    tweets += 1
+            f.write(line + '\n')
+    return tweets
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Write a synthetic tweet file.')
+    parser.add_argument('fname')
+    parser.add_argument('n', type=int, help='number of lines')
+    parser.add_argument('--rate', type=float, default=10.)
+    parser.add_argument('--n-tags', type=int, default=10000)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--tags-per-tweet', type=float, nargs='+', default=_TAGS_PER_TWEET)
+    parser.add_argument('--limit', type=float, default=.03)
+    parser.add_argument('--malformed', type=float, default=.01)
+    parser.add_argument('--late', type=float, default=.05)
+    parser.add_argument('--max-delay', type=float, default=90.)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    no_tweets = generate(args.fname, args.n, rate=args.rate, n_tags=args.n_tags,
+                         zipf=args.zipf, tags_per_tweet=args.tags_per_tweet,
+                         limit=args.limit, malformed=args.malformed, late=args.late,
+                         max_delay=args.max_delay, seed=args.seed)
+    print 'Wrote {:d} Tweets to {}'.format(no_tweets, args.fname)
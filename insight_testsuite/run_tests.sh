@@ -78,8 +78,11 @@ function run_all_tests {
 
     setup_testing_input_output
 
+    # options for src/main.py, if the test has any (e.g. --start)
+    TEST_ARGS=$(cat ${GRADER_ROOT}/tests/${test_folder}/args.txt 2>/dev/null)
+
     cd ${GRADER_ROOT}/temp
-    bash run.sh 2>&1
+    bash run.sh ${TEST_ARGS} 2>&1
     cd ../
 
     compare_outputs
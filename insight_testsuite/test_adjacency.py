@@ -0,0 +1,73 @@
+"""
+Checks the sparse-matrix statistics of adjacency.py against their NetworkX
+equivalents, on the window graphs of a synthetic tweet stream.
+
+Run from the root directory like:
+    $ python -m unittest discover insight_testsuite
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import numpy as np
+import networkx as nx
+from synthetic import generate
+from preprocess import Preprocess
+from analysis import rolled_graph_gen
+from adjacency import (rolled_adjacency_gen, to_graph, sp_mean_deg, sp_degree_dist,
+                       sp_density, sp_triangles, sp_components)
+
+
+def _mean_deg(G):
+    """Mean degree of the nodes with any edges (NaN if none), as sp_mean_deg()."""
+    degs = [d for d in G.degree().values() if d]
+    return np.mean(degs) if degs else np.nan
+
+
+NX_STATS = [(sp_mean_deg, _mean_deg),
+            (sp_degree_dist, nx.degree_histogram),
+            (sp_density, nx.density),
+            (sp_triangles, lambda G: sum(nx.triangles(G).values()) / 3),
+            (sp_components, nx.number_connected_components)]
+
+
+class AdjacencyTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        tmp = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmp, 'tweets.txt')
+            generate(fname, 1500, rate=5., n_tags=60, late=.1)
+            pre = Preprocess(fname)
+            pre.extract()
+        finally:
+            shutil.rmtree(tmp)
+        cls.vocab = pre.store.vocab
+        cls.snaps = list(rolled_adjacency_gen(pre.store, window=30.))
+        cls.graphs = list(rolled_graph_gen(pre.store, window=30.))
+
+    def test_to_graph(self):
+        self.assertEqual(len(self.snaps), len(self.graphs))
+        for snap, G in zip(self.snaps, self.graphs):
+            H = to_graph(snap, self.vocab)
+            self.assertEqual(sorted(H), sorted(G))
+            self.assertEqual(sorted(map(sorted, H.edges())), sorted(map(sorted, G.edges())))
+
+    def test_stats_match_networkx(self):
+        for sp_stat, nx_stat in NX_STATS:
+            batch = sp_stat.batch(self.snaps)
+            for i, (snap, G) in enumerate(zip(self.snaps, self.graphs)):
+                expected = nx_stat(G)
+                for value in (sp_stat(snap), batch[i]):
+                    np.testing.assert_allclose(value, expected, err_msg=sp_stat.__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
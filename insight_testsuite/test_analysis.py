@@ -0,0 +1,94 @@
+"""
+Checks the statistics of rolled_window_gen() and g_stats() against simpler
+runs that must give the same rows, on a synthetic tweet stream.
+
+Run from the root directory like:
+    $ python -m unittest discover insight_testsuite
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import numpy as np
+from synthetic import generate
+from preprocess import Preprocess
+import networkx as nx
+from analysis import (rolled_window_gen, g_stats, read_stats, mean_deg, n_components,
+                      giant_size, top_tags)
+from replay import replay_stats
+
+
+class AnalysisTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        fname = os.path.join(cls.tmp, 'tweets.txt')
+        generate(fname, 3000, rate=5., n_tags=60, late=.1)  # windows of ~100 tags
+        pre = Preprocess(fname)
+        pre.extract()
+        cls.store = pre.store
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_resume_after_partial_row(self):
+        full = os.path.join(self.tmp, 'full.txt')
+        part = os.path.join(self.tmp, 'part.txt')
+        for rle in (False, True):
+            g_stats(rolled_window_gen(self.store), mean_deg, savename=full, stream=True,
+                    rle=rle)
+            with open(full, 'rb') as f:
+                text = f.read()
+            for cut in (1, len(text) // 3, text.index('\n', len(text) // 2) + 1, len(text) - 2):
+                with open(part, 'wb') as f:  # as left by a run killed mid-write
+                    f.write(text[:cut])
+                g_stats(rolled_window_gen(self.store), mean_deg, savename=part, stream=True,
+                        rle=rle, resume=True)
+                if rle:  # runs are split where the first run stopped
+                    self.assertEqual(read_stats(part, rle=True).tolist(),
+                                     read_stats(full, rle=True).tolist())
+                else:
+                    with open(part, 'rb') as f:
+                        self.assertEqual(f.read(), text, cut)
+
+    def _rows(self, savename):
+        with open(os.path.join(self.tmp, savename), 'rb') as f:
+            return f.read().splitlines()
+
+    def test_replay_equals_serial(self):
+        runs = [((mean_deg,), {}),
+                ((mean_deg, n_components), dict(window=[20., 45.], components=True)),
+                ((top_tags, len), dict(window=30., top=3)),
+                ((len, mean_deg), dict(window=120., bucket=7.))]
+        for funcs, kwargs in runs:
+            serial = os.path.join(self.tmp, 'serial.txt')
+            g_stats(rolled_window_gen(self.store, **kwargs), *funcs, savename=serial)
+            for shards in (1, 3, 7, 16):
+                replay = os.path.join(self.tmp, 'replay.txt')
+                replay_stats(self.store, *funcs, processes=2, shards=shards, savename=replay,
+                             **kwargs)
+                self.assertEqual(self._rows('replay.txt'), self._rows('serial.txt'),
+                                 (kwargs, shards))
+
+    def test_components_match_networkx(self):
+        for kwargs in (dict(window=30., graph=True), dict(window=120., bucket=7.)):
+            windows = 0
+            for rw in rolled_window_gen(self.store, components=True, **kwargs):
+                graph = rw.graph if kwargs.get('graph') else nx.Graph(list(rw.edge_count))
+                self.assertEqual(n_components(rw), nx.number_connected_components(graph))
+                self.assertEqual(giant_size(rw),
+                                 max(len(c) for c in nx.connected_components(graph)))
+                windows += 1
+            self.assertGreater(windows, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
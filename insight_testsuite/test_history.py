@@ -0,0 +1,78 @@
+"""
+Checks that a GraphHistory rebuilds, and an IntervalIndex answers queries
+about, the same graphs that rolled_graph_gen() yields, on a synthetic tweet
+stream.
+
+Run from the root directory like:
+    $ python -m unittest discover insight_testsuite
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import numpy as np
+from synthetic import generate
+from preprocess import Preprocess
+from analysis import rolled_graph_gen, get_graphs
+from history import IntervalIndex
+
+
+def _contents(G):
+    """A graph's 'time', nodes (with their times) and edges, comparably."""
+    return (G.graph['time'], sorted((node, attr['time']) for node, attr in G.nodes(data=True)),
+            sorted(tuple(sorted(edge)) for edge in G.edges()))
+
+
+class HistoryTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        tmp = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmp, 'tweets.txt')
+            generate(fname, 1500, rate=5., n_tags=60, late=.1)
+            pre = Preprocess(fname)
+            pre.extract()
+        finally:
+            shutil.rmtree(tmp)
+        cls.store = pre.store
+        cls.graphs = [_contents(G) for G in rolled_graph_gen(pre.store, window=30.)]
+
+    def test_rebuilt_graphs(self):
+        graphs = self.graphs
+        for keyframe in (1, 7):
+            history = get_graphs(self.store, window=30., lazy=True, keyframe=keyframe)
+            self.assertEqual(len(history), len(graphs))
+            self.assertEqual([_contents(G) for G in history], graphs)  # stepping through
+            for i in np.random.RandomState(keyframe).permutation(len(graphs)):
+                self.assertEqual(_contents(history[i]), graphs[i], (keyframe, i))
+            self.assertEqual(_contents(history[-1]), graphs[-1])
+            self.assertRaises(IndexError, history.__getitem__, len(graphs))
+
+    def test_interval_queries(self):
+        graphs = self.graphs
+        for keyframe in (1, 7):
+            history = get_graphs(self.store, window=30., lazy=True, keyframe=keyframe)
+            index = IntervalIndex(history)
+            times = history.times
+            self.assertEqual(_contents(index.graph(times[0] - 1)), (None, [], []))
+            for i, t in enumerate(times):
+                j = index.window_at(t)  # the last of the windows at the same time
+                self.assertEqual(j, np.flatnonzero(times == t)[-1])
+                self.assertEqual(_contents(index.graph(t)), graphs[j], (keyframe, i))
+                G = history[j]
+                for tag in G:
+                    self.assertEqual(index.degree(tag, t), G.degree(tag))
+                    self.assertEqual(sorted(index.neighbors(tag, t)), sorted(G.neighbors(tag)))
+                self.assertEqual(index.degree('not a hashtag', t), 0)
+                self.assertEqual(index.neighbors('not a hashtag', t), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Checks that a LiveStream yields the same rows as a batch run over the same
+tweets, for each input of the testsuite, whether they come over a (loopback)
+TCP socket or are appended to a followed file.
+
+Run from the root directory like:
+    $ python -m unittest discover insight_testsuite
+"""
+import io
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from preprocess import Preprocess
+from analysis import rolled_window_gen, g_stats, mean_deg
+from live import LiveStream
+
+TESTS = os.path.join(ROOT, 'insight_testsuite', 'tests')
+FUNCS = (mean_deg, lambda rw: rw.n_nodes)
+TIMEOUT = 30.  # sec before a stream that stalls is stopped
+
+
+def _inputs():
+    """Path of each test's tweets.txt."""
+    for name in sorted(os.listdir(TESTS)):
+        path = os.path.join(TESTS, name, 'tweet_input', 'tweets.txt')
+        if os.path.isfile(path):
+            yield path
+
+
+def _expected(path):
+    """Rows of the batch run over a file's tweets."""
+    pre = Preprocess(path)
+    pre.extract()
+    return g_stats(rolled_window_gen(pre.store), *FUNCS).tolist()
+
+
+def _collect(stream, n):
+    """The first n rows of a stream, which is then stopped."""
+    timer = threading.Timer(TIMEOUT, stream.stop)
+    timer.start()
+    rows = []
+    try:
+        for row in stream:
+            rows.append(row)
+            if len(rows) == n:
+                stream.stop()
+    finally:
+        timer.cancel()
+    return rows
+
+
+class LiveStreamTest(unittest.TestCase):
+
+    def test_tcp(self):
+        for path in _inputs():
+            with open(path, 'rb') as f:
+                data = f.read()
+            server = socket.socket()
+            server.bind(('127.0.0.1', 0))
+            server.listen(1)
+
+            def serve():
+                conn, _ = server.accept()
+                for i in xrange(0, len(data), 100):  # lines split across sends
+                    conn.sendall(data[i:i + 100])
+                conn.close()
+                server.close()
+
+            threading.Thread(target=serve).start()
+            stream = LiveStream('tcp://127.0.0.1:%d' % server.getsockname()[1], *FUNCS)
+            expected = _expected(path)
+            self.assertEqual(list(stream), expected, path)
+
+    def test_followed_file(self):
+        for path in _inputs():
+            with open(path, 'rb') as f:
+                lines = f.readlines()
+            fd, name = tempfile.mkstemp(suffix='.txt')
+            os.close(fd)
+
+            def write():
+                for line in lines:  # in two pieces, to be read mid-line
+                    for piece in (line[:len(line) // 2], line[len(line) // 2:]):
+                        with open(name, 'ab') as f:
+                            f.write(piece)
+                        time.sleep(0.01)
+
+            try:
+                writer = threading.Thread(target=write)
+                writer.start()
+                expected = _expected(path)
+                rows = _collect(LiveStream(name, *FUNCS, poll=0.01), len(expected))
+                writer.join()
+            finally:
+                os.remove(name)
+            self.assertEqual(rows, expected, path)
+
+    def test_checkpoint_settings(self):
+        path = next(_inputs())
+        with open(path, 'rb') as f:
+            data = f.read()
+        tmp = tempfile.mkdtemp()
+        try:
+            checkpoint = os.path.join(tmp, 'stream.ckpt')
+            rows = list(LiveStream(io.BytesIO(data), *FUNCS, checkpoint=checkpoint))
+            for kwargs in (dict(window=30.), dict(lateness=10.), dict(histogram=True),
+                           dict(components=True)):
+                self.assertRaises(ValueError, LiveStream, io.BytesIO(data), *FUNCS,
+                                  checkpoint=checkpoint, **kwargs)
+            stream = LiveStream(io.BytesIO(''), *FUNCS, checkpoint=checkpoint, window=60.)
+            self.assertEqual(stream.no_rows, len(rows))  # same settings, so resumed
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
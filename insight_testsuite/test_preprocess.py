@@ -0,0 +1,173 @@
+"""
+Checks that the faster ways Preprocess has of parsing a tweet file (the fast
+parser, several processes, the cache, resuming after the file grows) give the
+same tweets and error counts as a plain parse.
+
+Run from the root directory like:
+    $ python -m unittest discover insight_testsuite
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import numpy as np
+from synthetic import generate
+import preprocess
+from preprocess import Preprocess
+
+TWEET = ('{"created_at":"Thu Mar 24 17:51:10 +0000 2016","id":1,"text":"#a #b",'
+         '"user":{"id":2,"created_at":"Wed Mar 23 10:00:00 +0000 2016"},'
+         '"entities":{"hashtags":[{"text":"a","indices":[0,2]},{"text":"b","indices":[3,5]}],'
+         '"urls":[]}}\n')
+MESSAGES = ['{"limit":{"track":12,"timestamp_ms":"1458841870000"}}\n',
+            '{"delete":{"status":{"id":1,"id_str":"1","user_id":3,"user_id_str":"3"},'
+            '"timestamp_ms":"1458841870000"}}\r\n']
+MALFORMED = [TWEET[:40] + '\n', TWEET[:-3] + '\n', TWEET[:-1] + 'x\n', TWEET[:-1] + '}\n',
+             TWEET.replace('","id"', '" "id"'), TWEET.replace('],"urls"', '] "urls"'),
+             MESSAGES[0][:-3] + '\n', '{"limit":{"track":012}}\n', 'not json at all\n', '12\n']
+
+
+def _parse(parse, line):
+    """What a parser makes of a line, or the type of error it raises."""
+    try:
+        return parse(line)
+    except Exception as e:
+        return type(e)
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_fast_parser_agrees(self):
+        lines = [TWEET] + MESSAGES + MALFORMED
+        tmp = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmp, 'tweets.txt')
+            generate(fname, 500)  # with rate-limit messages and tweets without entities
+            with open(fname, 'rb') as f:
+                lines += f.readlines()
+        finally:
+            shutil.rmtree(tmp)
+        for line in lines:
+            self.assertEqual(_parse(preprocess._parse_fast, line),
+                             _parse(preprocess._parse_full, line), line)
+
+    def test_messages_are_not_parsed(self):
+        full, preprocess._parse_full = preprocess._parse_full, None  # fails if called
+        try:
+            for line in MESSAGES:
+                self.assertIsNone(preprocess._parse_fast(line))
+        finally:
+            preprocess._parse_full = full
+
+
+class ExtractTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmp, 'tweets.txt')
+        generate(self.fname, 2000, rate=5., n_tags=300)
+        with open(self.fname, 'rb') as f:
+            self.lines = f.readlines()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, text, mode='wb'):
+        with open(self.fname, mode) as f:
+            f.write(text)
+
+    def assertSame(self, pre, lines, msg=None):
+        """Whether pre holds the tweets, and error count, of a plain extract() of lines."""
+        plain = Preprocess(os.path.join(self.tmp, 'plain.txt'))
+        with open(plain.input_file, 'wb') as f:
+            f.write(''.join(lines))
+        plain.extract()
+        self.assertTrue(np.array_equal(pre.times, plain.times), msg)
+        self.assertEqual(pre.tags, plain.tags, msg)
+        self.assertEqual((pre.no_saved_tweets, pre.no_file_errs),
+                         (plain.no_saved_tweets, plain.no_file_errs), msg)
+        self.assertEqual(pre.offset, len(''.join(lines)), msg)
+
+    def test_cache(self):
+        lines = self.lines
+        self._write(''.join(lines[:500]))
+        Preprocess(self.fname, cache=True).extract()
+        for end in (500, 520, 540, 900, 1200, 1210, 2000):  # merged at 1200
+            self._write(''.join(lines[:end]))
+            pre = Preprocess(self.fname, cache=True)
+            pre.extract()
+            self.assertSame(pre, lines[:end], end)
+        segments = [name for name in os.listdir(self.tmp) if '.cache.npz.' in name]
+        self.assertEqual(len(segments), 2)  # from 1200 and 1210
+
+        self._write(''.join(lines[:2000]).replace('"created_at":"', '"created_at": "', 1))
+        pre = Preprocess(self.fname, cache=True)  # same size, but not the same file
+        pre.extract()
+        self.assertSame(pre, [lines[0].replace('"created_at":"', '"created_at": "')] +
+                        lines[1:2000])
+
+    def test_cache_segments(self):
+        lines = self.lines
+        self._write(''.join(lines[:1000]))
+        pre = Preprocess(self.fname, cache=True)
+        pre.extract()
+        for end in range(1000, 1500, 50):
+            self._write(''.join(lines[end:end + 50]), 'ab')
+            pre.extract(overwrite=False)
+            cached = Preprocess(self.fname, cache=True)
+            cached.extract()
+            self.assertSame(cached, lines[:end + 50], end)
+        self.assertEqual(len([name for name in os.listdir(self.tmp)
+                              if '.cache.npz.' in name]), 10)  # one per extract()
+
+
+    def test_resume(self):
+        lines = self.lines
+        pre = Preprocess(self.fname)
+        self._write('')
+        written = 0
+        for end in (1, 10, 300, 301, 1000, 1500):
+            text = ''.join(lines[written:end])
+            self._write(text[:-20], 'ab')  # the last line is still being written
+            pre.extract(overwrite=False)
+            self.assertSame(pre, lines[:end - 1], end)
+            self._write(text[-20:], 'ab')
+            pre.extract(overwrite=False)
+            self.assertSame(pre, lines[:end], end)
+            written = end
+
+        self._write(''.join(lines[:800]))  # truncated
+        pre.extract(overwrite=False)
+        self.assertSame(pre, lines[:800])
+
+        rotated = os.path.join(self.tmp, 'rotated.txt')  # replaced by a new, bigger file
+        with open(rotated, 'wb') as f:
+            f.write(''.join(lines[1000:1900]))
+        os.rename(rotated, self.fname)
+        pre.extract(overwrite=False)
+        self.assertSame(pre, lines[1000:1900])
+
+
+    def test_processes(self):
+        lines = self.lines
+        for processes in (2, 3, 7):
+            pre = Preprocess(self.fname)
+            self._write(''.join(lines[:3]))  # fewer lines than processes
+            pre.extract(processes=processes)
+            self.assertSame(pre, lines[:3], processes)
+            self._write(''.join(lines[3:1200]) + lines[1200][:-20], 'ab')
+            pre.extract(overwrite=False, processes=processes)
+            self.assertSame(pre, lines[:1200], processes)
+            self._write(lines[1200][-20:] + ''.join(lines[1201:]), 'ab')
+            pre.extract(overwrite=False, processes=processes)
+            self.assertSame(pre, lines, processes)
+
+
+if __name__ == '__main__':
+    unittest.main()
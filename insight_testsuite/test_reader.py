@@ -0,0 +1,57 @@
+"""
+Checks that a TweetReader indexes the same tweets, and drops the same lines,
+as Preprocess.extract() does, including blank and whitespace-only lines.
+
+Run from the root directory like:
+    $ python -m unittest discover insight_testsuite
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import numpy as np
+from synthetic import generate
+from preprocess import Preprocess
+from reader import TweetReader
+
+
+class ReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmp, 'tweets.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_same_as_extract(self):
+        generate(self.fname, 500)  # with rate-limit messages and malformed lines
+        with open(self.fname, 'rb') as f:
+            lines = f.readlines()
+        blanks = ['\n', '\r\n', '  \t\n', '\r\n']
+        with open(self.fname, 'wb') as f:
+            for i, line in enumerate(lines):
+                f.write(line if i % 3 else line.replace('\n', '\r\n'))
+                if not i % 50:
+                    f.write(blanks[i // 50 % len(blanks)])
+
+        pre = Preprocess(self.fname)
+        pre.extract()
+        for index in (False, True, True):  # built in memory, then saved, then loaded
+            reader = TweetReader(self.fname, index=index)
+            self.assertEqual(len(reader), pre.no_saved_tweets)
+            self.assertEqual(reader.no_file_errs, pre.no_file_errs)
+            self.assertTrue(np.array_equal(reader.times, pre.times))
+            store = reader.store()
+            self.assertEqual([store.hashtags(i) for i in range(len(store))], pre.tags)
+            reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
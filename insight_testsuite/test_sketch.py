@@ -0,0 +1,83 @@
+"""
+Checks the Trending sketch against exact counts, when every hashtag fits in
+its summaries, and that warming one up part way through a stream gives the
+same top hashtags and pairs as counting from the start.
+
+Run from the root directory like:
+    $ python -m unittest discover insight_testsuite
+"""
+import os
+import sys
+import unittest
+from collections import Counter
+from heapq import nlargest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import numpy as np
+from sketch import SpaceSaving, HeavyHitters, Trending
+
+WINDOW, BUCKET = 60., 5.
+
+
+def _stream(n, n_tags, seed=0):
+    """Tweet times (a few seconds out of order) and hashtag lists, of Zipf popularity."""
+    rng = np.random.RandomState(seed)
+    times = np.cumsum(rng.exponential(.5, n)) + rng.uniform(-10., 0., n) * (rng.rand(n) < .1)
+    tags = [list(rng.zipf(1.3, rng.randint(0, 4)) % n_tags) for _ in range(n)]
+    return times, tags
+
+
+def _serial(sketch, times, tags, start=0):
+    """Feed tweets [start:] to a sketch as a window would; yield its top k after each."""
+    now = times[:start].max() if start else None
+    for t, tweet in zip(times[start:], tags[start:]):
+        now = t if now is None else max(now, t)
+        sketch.advance(now)
+        if t >= now - WINDOW:  # not dropped for being late
+            sketch.insert(t, tweet)
+        yield sketch.top_tags(), sketch.top_pairs()
+
+
+class SketchTest(unittest.TestCase):
+
+    def test_space_saving_exact_when_keys_fit(self):
+        summary = SpaceSaving(capacity=20)
+        keys = np.random.RandomState(0).zipf(1.5, 5000) % 20
+        for key in keys:
+            summary.add(key)
+        self.assertEqual(summary.counts, dict(Counter(keys)))
+        self.assertEqual(set(summary.errors.values()), {0})
+
+    def test_top_k_exact_when_vocab_fits(self):
+        times, tags = _stream(3000, n_tags=40)
+        hh = HeavyHitters(WINDOW, BUCKET, k=5, capacity=40)
+        now = None
+        counted = []  # (bucket, keys) of the tweets counted so far
+        for t, tweet in zip(times, tags):
+            now = t if now is None else max(now, t)
+            hh.advance(now)
+            keys = list(set(tweet))
+            if keys and hh.add(t, keys):
+                counted.append((t // BUCKET, keys))
+            oldest = (now - WINDOW) // BUCKET  # counts are kept per bucket
+            exact = Counter(key for k, keys in counted if k >= oldest for key in keys)
+            self.assertEqual(hh.top(), [(key, n) for n, key in
+                                        nlargest(5, [(n, key) for key, n in exact.items()])])
+
+    def test_warm_up_equals_serial(self):
+        times, tags = _stream(2000, n_tags=100)  # many more than the summaries keep
+        serial = list(_serial(Trending(WINDOW, BUCKET, k=3, capacity=3), times, tags))
+        runmax = np.maximum.accumulate(times)
+        counted = (np.array([len(tweet) for tweet in tags]) > 0) & (times >= runmax - WINDOW)
+        for start in (1, 7, 150, 999, 1500):
+            sketch = Trending(WINDOW, BUCKET, k=3, capacity=3)
+            sketch.advance(times[:start].max())
+            sketch.warm_up(times[:start], tags[:start], counted[:start])
+            self.assertEqual(list(_serial(sketch, times, tags, start)), serial[start:], start)
+
+
+if __name__ == '__main__':
+    unittest.main()
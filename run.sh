@@ -4,7 +4,7 @@
 # example of the run script for running the word count
 
 # I'll execute my programs, with the input directory tweet_input and output the files in the directory tweet_output
-python ./src/main.py ./tweet_input/tweets.txt ./tweet_output/output.txt
+python ./src/main.py ./tweet_input/tweets.txt ./tweet_output/output.txt "$@"
 
 
 
@@ -1,5 +1,5 @@
 __author__ = 'tbsexton'
-__all__ = ['analysis', 'preprocess']
+__all__ = ['adjacency', 'analysis', 'history', 'live', 'metrics', 'preprocess', 'reader', 'replay', 'sketch', 'store', 'window']
 """
 Future restructuring will remove /src/ hierarchy, to be more pythonic.
 """
\ No newline at end of file
@@ -0,0 +1,194 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from analysis import rolled_window_gen
+
+__author__ = 'tbsexton'
+"""
+HashStream's adjacency module, an alternative to NetworkX graphs for window
+statistics. Each window is snapshotted as a SciPy sparse (CSR) adjacency
+matrix over its hashtags, and statistics are computed with vectorized matrix
+operations instead of walking a dict-of-dicts graph.
+
+Every statistic here works on a single snapshot, e.g. sp_mean_deg(snap), but
+also has a .batch() version which takes a list of snapshots at once. This
+stacks them into one block-diagonal matrix, so that the statistics of many
+windows cost a handful of NumPy calls. g_stats(..., batch=n) makes use of it.
+
+Anything not ported here can still use NetworkX, via to_graph().
+"""
+
+
+__all__ = ['Snapshot', 'window_adjacency', 'rolled_adjacency_gen', 'to_graph',
+           'sp_mean_deg', 'sp_degree_dist', 'sp_density', 'sp_triangles',
+           'sp_components']
+
+
+class Snapshot(object):
+
+    def __init__(self, matrix, nodes, time=None):
+        """
+        Defines an (immutable) snapshot of a window's co-occurrence graph.
+
+        Parameters
+        ----------
+        matrix : SciPy CSR matrix
+            symmetric adjacency matrix of the window's hashtags, with 1 on the
+            diagonal for hashtags repeated within a tweet (self-loops).
+        nodes : NumPy array
+            hashtag (or interned hashtag id) of each row/column.
+        time : object, optional
+            the window's 'now' when the snapshot was taken.
+        """
+        self.matrix = matrix
+        self.nodes = nodes
+        self.time = time
+
+    def labels(self, vocab=None):
+        """Hashtag of each row/column, looking up interned ids in vocab."""
+        if vocab is None:
+            return list(self.nodes)
+        return [vocab[i] for i in self.nodes]
+
+
+def window_adjacency(rw):
+    """
+    Snapshot the current graph of a RollingWindow, which need not keep its
+    own NetworkX graph (i.e. graph=False).
+
+    Parameters
+    ----------
+    rw : RollingWindow object
+
+    Returns
+    -------
+    Snapshot
+        CSR adjacency over the hashtags in the window
+    """
+    nodes = list(rw.degree)
+    index = dict((v, i) for i, v in enumerate(nodes))
+    n = len(nodes)
+
+    u = np.fromiter((index[a] for a, b in rw.edge_count), dtype=np.int64)
+    v = np.fromiter((index[b] for a, b in rw.edge_count), dtype=np.int64)
+    off = u != v  # self-loops only go on the diagonal once
+    rows = np.concatenate([u, v[off]])
+    cols = np.concatenate([v, u[off]])
+
+    A = sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(n, n))
+    return Snapshot(A, np.array(nodes), time=rw.now)
+
+
+def rolled_adjacency_gen(df, window=60., start=0, stop=None, lateness=None):
+    """
+    Same as rolled_window_gen() (see analysis.py), but yields an independent
+    Snapshot of each window, which can be kept or batched. Hashtags are the
+    interned ids of a TweetStore, or the hashtag strings of a DataFrame.
+
+    Windows whose contents did not change share the previous one's matrix.
+    """
+    snap, version = None, None
+    for rw in rolled_window_gen(df, window=window, start=start, stop=stop,
+                                lateness=lateness):
+        if rw.version != version:
+            snap, version = window_adjacency(rw), rw.version
+        else:
+            snap = Snapshot(snap.matrix, snap.nodes, time=rw.now)
+        yield snap
+
+
+def to_graph(snap, vocab=None):
+    """NetworkX graph of a Snapshot, for statistics not ported to matrices."""
+    import networkx as nx  # NetworkX is only imported when it is needed
+    labels = snap.labels(vocab)
+    rows, cols = sp.triu(snap.matrix).nonzero()
+
+    G = nx.Graph(time=snap.time)
+    G.add_nodes_from(labels)
+    G.add_edges_from((labels[i], labels[j]) for i, j in zip(rows, cols))
+    return G
+
+
+def _stack(snaps):
+    """
+    Block-diagonal matrix of a list of snapshots (or matrices), along with
+    the number of windows and which window each row belongs to.
+    """
+    mats = [s.matrix if isinstance(s, Snapshot) else s for s in snaps]
+    A = sp.block_diag(mats, format='csr') if mats else sp.csr_matrix((0, 0))
+    sizes = [m.shape[0] for m in mats]
+    owner = np.repeat(np.arange(len(mats)), sizes)
+    return A, len(mats), owner
+
+
+def _per_window(owner, k, weights=None):
+    """Sum of per-row weights (or count of rows) in each of k windows."""
+    return np.bincount(owner, weights=weights, minlength=k).astype(float)
+
+
+def _batched(batch):
+    """Make the single-snapshot version of a batched statistic."""
+    def single(snap):
+        return batch([snap])[0]
+    single.batch = batch
+    single.__name__ = batch.__name__.lstrip('_').replace('_batch', '')
+    single.__doc__ = batch.__doc__
+    return single
+
+
+def _degrees(A):
+    """Node degrees, counting self-loops twice (as in NetworkX)."""
+    return np.asarray(A.sum(axis=1)).ravel() + A.diagonal()
+
+
+def _sp_mean_deg_batch(snaps):
+    """Mean degree of each window's graph. Ignore unconnected nodes."""
+    A, k, owner = _stack(snaps)
+    degs = _degrees(A)
+    conn = degs > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (_per_window(owner[conn], k, degs[conn]) /
+                _per_window(owner[conn], k))
+
+
+def _sp_degree_dist_batch(snaps):
+    """Degree distribution (counts of nodes by degree) of each window's graph."""
+    A, k, owner = _stack(snaps)
+    degs = _degrees(A).astype(np.int64)
+    return [np.bincount(degs[owner == i]) for i in range(k)]
+
+
+def _sp_density_batch(snaps):
+    """Density of each window's graph, as with nx.density()."""
+    A, k, owner = _stack(snaps)
+    n = _per_window(owner, k)
+    edges = (_per_window(owner, k, np.diff(A.indptr)) +
+             _per_window(owner, k, A.diagonal())) / 2.  # self-loops once
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 1, 2 * edges / (n * (n - 1)), 0.)
+
+
+def _sp_triangles_batch(snaps):
+    """Number of triangles in each window's graph (ignoring self-loops)."""
+    A, k, owner = _stack(snaps)
+    B = A - sp.diags(A.diagonal())
+    B.eliminate_zeros()
+    closed = np.asarray(B.dot(B).multiply(B).sum(axis=1)).ravel()  # 2x per node
+    return _per_window(owner, k, closed) / 6.
+
+
+def _sp_components_batch(snaps):
+    """Number of connected components in each window's graph."""
+    A, k, owner = _stack(snaps)
+    if not A.shape[0]:
+        return np.zeros(k)
+    _, labels = connected_components(A, directed=False)
+    first = np.unique(labels, return_index=True)[1]  # one node per component
+    return _per_window(owner[first], k)
+
+
+sp_mean_deg = _batched(_sp_mean_deg_batch)
+sp_degree_dist = _batched(_sp_degree_dist_batch)
+sp_density = _batched(_sp_density_batch)
+sp_triangles = _batched(_sp_triangles_batch)
+sp_components = _batched(_sp_components_batch)
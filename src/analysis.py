@@ -1,8 +1,13 @@
 import numpy as np
-import networkx as nx
-import pandas as pd
+import os
+import time
 from itertools import combinations, islice, dropwhile  # native to python
-from pandas.tseries.offsets import *  # for elegantly dealing with timestamps
+from heapq import heapify, heappop
+from window import RollingWindow, BucketedWindow, WindowSet
+from sketch import Trending
+from store import TweetStore
+from reader import TweetReader
+from metrics import metrics
 
 __author__ = 'tbsexton'
 """
@@ -22,7 +27,8 @@ requested. See documentation in README.md for more.
 """
 
 
-__all__ = ['rolled_graph_gen', 'g_stats', 'draw_lifted', 'get_graphs', 'mean_deg']
+__all__ = ['rolled_graph_gen', 'rolled_window_gen', 'g_stats', 'read_stats', 'draw_lifted', 'get_graphs',
+           'mean_deg', 'degree_hist', 'n_components', 'giant_size', 'top_tags', 'top_pairs']
 
 
 def graph_from_tweet(df, tw_no):
@@ -35,7 +41,7 @@ def graph_from_tweet(df, tw_no):
 
     Parameters
     ----------
-    df : Pandas DataFrame
+    df : Pandas DataFrame, or TweetStore
         to extract tweet info from
     tw_no : integer
         index location (row) of desired tweet in df
@@ -46,12 +52,16 @@ def graph_from_tweet(df, tw_no):
         complete graph on tweet's hashtags
     """
 
-    G = nx.Graph(time=df.time[tw_no])
+    if isinstance(df, TweetStore):
+        time, nodes = df.stamp(tw_no), df.hashtags(tw_no)
+    else:
+        time, nodes = df.time[tw_no], df.hashtags[tw_no]  # nodes are hashtag strings
 
-    nodes = df.hashtags[tw_no]  # nodes are hashtag strings
+    import networkx as nx  # NetworkX is only imported when graphs are built
+    G = nx.Graph(time=time)
     edges = combinations(nodes, 2)  # all edges in complete graph
 
-    G.add_nodes_from(nodes, time=df.time[tw_no])
+    G.add_nodes_from(nodes, time=time)
     G.add_edges_from(edges)
     return G
 
@@ -68,7 +78,7 @@ def graph_from_set(df):
 
     Parameters
     ----------
-    df : Pandas DataFrame
+    df : Pandas DataFrame, or TweetStore
         to extract tweet info from, usually within a time window.
 
     Return
@@ -77,12 +87,21 @@ def graph_from_set(df):
         composition graph on all tweets' hashtags in df
     """
 
-    G = nx.Graph(time=df.time.max())  # initialize empty graph with latest timestamp
+    import networkx as nx
+    if isinstance(df, TweetStore):
+        rows = range(len(df))
+        latest = df.stamp(np.argmax(df.times)) if len(df) else None
+        lengths = np.diff(df.offsets)
+    else:
+        rows = df.index
+        latest = df.time.max()
+        lengths = df.hashtags.map(len).values
 
-    for i in df.itertuples():
-        tw_no, tags, time = i
+    G = nx.Graph(time=latest)  # initialize empty graph with latest timestamp
 
-        if len(tags) < 2:  # skip tweets with no hashtag co-occurrence
+    for tw_no, n_tags in zip(rows, lengths):
+
+        if n_tags < 2:  # skip tweets with no hashtag co-occurrence
             continue
         H = graph_from_tweet(df, tw_no)  # current tweet's complete k-graph
         G = nx.compose(G, H)  # add new edges and nodes found in H not already in G
@@ -102,6 +121,7 @@ def draw_lifted(G, pos=None, offset=0.07, fontsize=16):
     except ImportError:
         print "MUST have MatPlotLib installed to plot network!"
         raise
+    import networkx as nx
 
     # first check if desired position library is supplied, else use springs
     pos = nx.spring_layout(G) if pos is None else pos
@@ -115,23 +135,227 @@ def draw_lifted(G, pos=None, offset=0.07, fontsize=16):
     plt.show()
 
 
-def rolled_graph_gen(df, window=60., start=0, stop=None):
+class _LazyList(object):
+    """Read-only list-like view, computing item i as get(i) on access."""
+
+    def __init__(self, get):
+        self.get = get
+
+    def __getitem__(self, i):
+        return self.get(i)
+
+
+def rolled_window_gen(df, window=60., start=0, stop=None, graph=False, lateness=None,
+                      changed_only=False, bucket=None, warm=False, top=None, components=False,
+                      histogram=False):
     """
-    Procedurally creates mini-dataframes with only tweets received
-    within [window] seconds of the most recent one. Creates the
-    composition graph for each mini-df.
+    Procedurally updates a rolling window with only tweets received
+    within [window] seconds of the most recent one, and yields the
+    window after each tweet.
 
-    Note that
+    Note that the window is kept up to date incrementally (see window.py),
+    so each tweet costs only as much as the hashtags entering and leaving
+    the window.
 
     Parameters
     ----------
-    df : Pandas DataFrame object
+    df : Pandas DataFrame object, TweetStore, or TweetReader
+        contains tweet hashtag lists and timestamps. A TweetReader only
+        parses the tweets that can fall in windows between start and stop.
+    window : integer, float, or list of them
+        rolling window size in sec (number of seconds to track tweets). Given
+        several sizes, all of the windows are kept in the same pass, and
+        yielded together as a WindowSet (see window.py).
+    start : integer
+        tweet number to skip forward to
+    stop : integer, optional
+    graph : bool
+        whether the window should maintain its NetworkX graph. Leave off
+        when only degree statistics (e.g. mean_deg()) are wanted.
+    lateness : integer, float, optional
+        how many sec behind "now" an out-of-order tweet may be and still be
+        counted. Defaults to the window size.
+    changed_only : bool
+        only yield the window when a tweet entered or left it since it was
+        last yielded, i.e. skip tweets that left its contents as they were.
+        The skipped windows differ only in 'now' (the graph's 'time').
+    bucket : integer, float, optional
+        aggregate the window into buckets of this many sec, rather than keeping
+        each tweet (see BucketedWindow in window.py). Memory then depends on
+        the number of buckets, not tweets, for long windows. Not with graph.
+    warm : bool
+        start at tweet [start] with the window exactly as a run from the first
+        tweet would have it, rather than letting earlier tweets join as "now"
+        catches up with them. The windows (and statistics) of a run from 0 to
+        n are then those of runs from 0 to k and from k to n, back-to-back
+        (apart from rw.n_late, etc., which only count from [start]).
+    top : int, optional
+        also keep track of the [top] most frequent hashtags and pairs of
+        hashtags in each window, in a Trending sketch (see sketch.py) with
+        buckets of [bucket] sec (default 1/20th of the window), for the
+        top_tags() and top_pairs() statistics. Hashtags are counted in every
+        tweet in the window, including those with only one hashtag.
+    components : bool
+        keep track of the connected components of each window as tweets enter
+        and leave it (see Components in window.py), for the n_components() and
+        giant_size() statistics.
+    histogram : bool
+        keep a histogram of the node degrees of each window as it changes, for
+        the degree_hist() statistic.
+
+    Yields
+    ------
+    rw: RollingWindow object (or WindowSet)
+        the (live) window, for all windows with at least 2 hashtags
+        between start and stop. It is only valid until the next step.
+
+    Notes
+    -----
+    Tweets may be out of order, so this tracks the most recent
+    received timestamp as "now". The window counts how many tweets
+    arrived late (rw.n_late), and how many of those were dropped
+    (rw.n_dropped).
+
+    Window size, update time, and evicted/late/dropped tweets are
+    recorded in the metrics registry (see metrics.py), as 'window.*'.
+    """
+
+    if isinstance(df, TweetReader):
+        df, start, stop = df.window_slice(start, stop, np.max(window))
+
+    n = len(df)
+    if not n:
+        return
+
+    if isinstance(df, TweetStore):
+        times = df.times.view(np.int64)
+        if graph:  # nodes and 'time' attributes as in the DataFrame
+            stamps, tags = _LazyList(df.stamp), _LazyList(df.hashtags)
+        else:  # interned hashtag ids are cheaper to count with
+            stamps, tags = times, _LazyList(lambda i: df.tag_ids(i).tolist())
+        lengths = np.diff(df.offsets)
+    else:
+        times = np.asarray(df.time.values, dtype='datetime64[ns]').view(np.int64)
+        # Timestamps are only boxed for the graph 'time' attributes
+        stamps = df.time.tolist() if graph else times
+        tags = df.hashtags.tolist()
+        lengths = [len(t) for t in tags[:start]]
+
+    lateness = None if lateness is None else int(round(lateness*1e9))  # times in ns
+    if bucket is not None:
+        if graph:
+            raise ValueError('bucketed windows keep no graph')
+        bucket = max(1, int(round(bucket*1e9)))
+    if np.ndim(window):  # several window sizes at once
+        rw = WindowSet([int(round(w*1e9)) for w in window], graph=graph, histogram=histogram,
+                       lateness=lateness, bucket=bucket, components=components)
+    elif bucket is not None:
+        rw = BucketedWindow(window=int(round(window*1e9)), bucket=bucket, histogram=histogram,
+                            lateness=lateness, components=components)
+    else:
+        rw = RollingWindow(window=int(round(window*1e9)), graph=graph, histogram=histogram,
+                           lateness=lateness, components=components)
+    if top:
+        vocab = df.vocab if isinstance(df, TweetStore) and not graph else None  # tags are ids
+        for w in (rw.windows if isinstance(rw, WindowSet) else [rw]):
+            w.sketch = Trending(w.window, bucket or max(1, w.window // 20), k=top, vocab=vocab)
+    first = np.argmin(times)
+    rw.advance(times[first], stamps[first])  # earliest timestamp in data
+
+    if warm and start > 0:
+        _warm_up(rw, times, stamps, tags, lengths, min(start, n))
+        pending = []
+    else:
+        # tweets before [start] are not iterated over, but still join the
+        # window once "now" catches up with them.
+        least = 1 if top else 2  # a sketch counts the hashtags of unpaired ones too
+        pending = [(times[j], j) for j in range(min(start, n)) if lengths[j] >= least]
+        heapify(pending)
+
+    m = metrics if metrics.enabled else None
+    counts = (0, 0, 0)  # evicted, late and dropped tweets, as last recorded
+    last = None  # version of the window last yielded
+
+    for i in islice(xrange(n), start, stop):
+        if m is not None:
+            t = time.time()
+        rw.advance(times[i], stamps[i])  # update 'what time it is'
+        while pending and pending[0][0] <= rw.now:
+            _, j = heappop(pending)
+            rw.insert(times[j], tags[j], stamps[j], seq=j)
+        rw.push(times[i], tags[i], stamps[i], seq=i)
+        if m is not None:
+            m.observe('window.update', time.time() - t)
+            counts = _window_metrics(m, rw, counts)
+
+        if rw.n_nodes > 1:  # ignore it if size less than 2
+            if changed_only:
+                if rw.version == last:
+                    continue
+                last = rw.version
+            yield rw
+
+
+def _warm_up(rw, times, stamps, tags, lengths, start):
+    """
+    Fill a window with the tweets before [start] that a run from the first
+    tweet would still hold at [start]. See rolled_window_gen(warm=True).
+    """
+    times, lengths = times[:start], np.asarray(lengths[:start])
+    latest = np.argmax(times)  # the tweet that set "now" (first, if tied)
+    rw.advance(times[latest], stamps[latest])
+
+    # tweet j was counted if it was within the lateness of "now" when it arrived
+    runmax = np.maximum.accumulate(times)
+    for w in (rw.windows if isinstance(rw, WindowSet) else [rw]):
+        sketch, w.sketch = w.sketch, None  # its buckets reach further back
+        cutoff = rw.now - w.window - getattr(w, 'bucket', 0)  # for a bucket's slack
+        counted = times >= runmax - w.lateness
+        kept = (lengths > 1) & counted & (times >= cutoff)
+        for j in np.flatnonzero(kept):  # in order of arrival
+            w.insert(times[j], tags[j], stamps[j], seq=j)  # drops any that expired
+        if sketch is not None:
+            sketch.warm_up(times, tags, (lengths > 0) & counted)
+            w.sketch = sketch
+
+
+def _window_metrics(m, rw, counts):
+    """Record the size of a window, and what happened to it since [counts]."""
+    m.gauge('window.tweets', len(rw))
+    m.gauge('window.nodes', rw.n_nodes)
+    m.gauge('window.edges', rw.n_edges)
+    new = (rw.n_evicted, rw.n_late, rw.n_dropped)
+    for name, a, b in zip(('window.evicted', 'window.late', 'window.dropped'), counts, new):
+        if b != a:
+            m.count(name, b - a)
+    return new
+
+
+def rolled_graph_gen(df, window=60., start=0, stop=None, copy=True, lateness=None,
+                     changed_only=False):
+    """
+    Creates the composition graph of tweets received within [window]
+    seconds of the most recent one, for every tweet.
+
+    Parameters
+    ----------
+    df : Pandas DataFrame object, TweetStore, or TweetReader
         contains tweet hashtag lists and timestamps
     window : integer, float
         rolling window size in sec (number of seconds to track tweets)
     start : integer
         tweet number to skip forward to
     stop : integer, optional
+    copy : bool
+        whether to yield an independent copy of each graph (default), or
+        the window's live graph, which is only valid until the next step.
+    lateness : integer, float, optional
+        how many sec behind "now" an out-of-order tweet may be and still be
+        counted. Defaults to the window size.
+    changed_only : bool
+        skip the graphs of tweets that left the window's contents as they were.
+        Those graphs have the same nodes, edges and node 'time's as the last
+        one yielded, but possibly a later graph 'time' (i.e. 'now').
 
     Yields
     ------
@@ -141,37 +365,28 @@ def rolled_graph_gen(df, window=60., start=0, stop=None):
 
     Notes
     -----
-    Tweets may be out of order, so this tracks the most recent
-    received timestamp as "now".
+    See rolled_window_gen(), which this wraps.
     """
+    for rw in rolled_window_gen(df, window=window, start=start, stop=stop,
+                                graph=True, lateness=lateness, changed_only=changed_only):
+        yield rw.snapshot() if copy else rw.graph
 
-    current_time = df.time.min()  # earliest timestamp in data
 
-    iterator = range(len(df.index))
-    try:
-        from tqdm import tqdm  # for pretty progress-bar with almost no overhead
-        iter_obj = tqdm(islice(iterator, start, stop))
-    except ImportError:
-        print "tqdm not installed, loop will not be monitored..."
-        iter_obj = islice(iterator, start, stop)
-
-    for i in iter_obj:
-        tags, time = df.loc[i]
-
-        if time > current_time:  # update 'what time it is'
-            current_time = pd.to_datetime(time)
-
-        # slice out the tweets in the time window.
-        incl = df.loc[(df.time >= current_time - window*Second()) &\
-                      (df.time <= current_time) &\
-                      (df.index <= i)]
-        G = graph_from_set(incl)  # create composition graph
-        G.graph['time'] = current_time  # timestamp it
-        if nx.number_of_nodes(G) >    1:  # ignore it if size less than 2
-            yield G
+def get_graphs(df, start=0, stop=None, window=60., lazy=False, keyframe=500):
+    """
+    The graph of every window between start and stop, as a list (see
+    rolled_graph_gen()).
 
+    With lazy=True, returns a GraphHistory instead (see history.py), which only
+    keeps the changes from one window to the next, plus a complete graph every
+    [keyframe] windows, and rebuilds each graph when it is asked for. Its memory
+    grows with the number of changes, rather than windows times graph size.
+    """
+    if lazy:
+        from history import GraphHistory
+        return GraphHistory(rolled_window_gen(df, window=window, start=start, stop=stop,
+                                              graph=True), keyframe=keyframe)
 
-def get_graphs(df, start=0, stop=None, window=60.):
     graph_gen = rolled_graph_gen(df, window=window,
                                  start=start,
                                  stop=stop)
@@ -183,11 +398,67 @@ def get_graphs(df, start=0, stop=None, window=60.):
 
 
 def mean_deg(graph):
-    """Calculate mean degree of graph. Ignore unconnected nodes."""
+    """Calculate mean degree of graph. Ignore unconnected nodes.
+    Also accepts a RollingWindow, whose mean degree is kept up to date."""
+    if isinstance(graph, RollingWindow):
+        return graph.mean_degree()
     degs = np.array(graph.degree().values())
     return np.mean(degs[np.nonzero(degs)])
 
 
+def degree_hist(graph):
+    """Number of nodes of each degree (from 0), as in nx.degree_histogram().
+    Also accepts a RollingWindow, whose histogram is kept up to date if it has one
+    (see rolled_window_gen(histogram=True))."""
+    if isinstance(graph, RollingWindow):
+        hist = graph.histogram
+        if hist is None:
+            return np.bincount(graph.degree.values(), minlength=1)
+        counts = np.zeros(max(hist) + 1 if hist else 1, dtype=int)
+        counts[hist.keys()] = hist.values()
+        return counts
+    import networkx as nx
+    return np.array(nx.degree_histogram(graph))
+
+
+def n_components(graph):
+    """Number of connected components of graph. Also accepts a RollingWindow
+    that keeps track of its components (see rolled_window_gen(components=True))."""
+    if isinstance(graph, RollingWindow):
+        if graph.components is not None:
+            return len(graph.components)
+        graph = graph.graph
+    import networkx as nx
+    return nx.number_connected_components(graph)
+
+
+def giant_size(graph):
+    """Number of nodes in the largest connected component of graph. Also accepts
+    a RollingWindow that keeps track of its components."""
+    if isinstance(graph, RollingWindow):
+        if graph.components is not None:
+            return graph.components.largest()
+        graph = graph.graph
+    import networkx as nx
+    return max(len(c) for c in nx.connected_components(graph))
+
+
+def top_tags(rw):
+    """
+    Most frequent hashtags of a window with a Trending sketch (see
+    rolled_window_gen(top=k)), as a list of (hashtag, estimated count).
+    """
+    return rw.sketch.top_tags()
+
+
+def top_pairs(rw):
+    """
+    Most frequent pairs of hashtags of a window with a Trending sketch (see
+    rolled_window_gen(top=k)), as a list of ((hashtag, hashtag), estimated count).
+    """
+    return rw.sketch.top_pairs()
+
+
 def g_stats(graph_gen, *funcs, **kwargs):
     """
     Utility function that returns a time-series of graph statistics for the windowed
@@ -198,23 +469,219 @@ def g_stats(graph_gen, *funcs, **kwargs):
     ----------
     graph_gen : graph generator, or list of graphs
         use rolled_graph_gen() iterable with desired bounds. Can alternatively
-        use a list of pre-calculated graphs.
+        use a list of pre-calculated graphs, or rolled_window_gen() for
+        statistics that accept a RollingWindow (i.e. mean_deg()). With several
+        window sizes, there is a column per function and window size (NaN
+        where that window has fewer than 2 hashtags).
     *funcs : function inputs
-        any set of functions that take in a graph and return a statistic
+        any set of functions that take in a graph and return a statistic. Those
+        returning lists (i.e. top_tags()) are written as 'tag:count,...' columns,
+        and those returning arrays (i.e. sp_degree_dist()) as 'n,n,...'.
     **kwargs :
         savename : string, optional
             input path and name of desired save location/file, '/path/to/file.txt'
+        stream : bool, optional
+            write each row to savename as soon as it is calculated, rather than
+            collecting all of them first, so memory use stays constant. Returns
+            the number of rows written, instead of the statistics.
+        flush : int, optional
+            when streaming, flush the output to disk every [flush] rows.
+        resume : bool, optional
+            when streaming, append to an existing savename instead of over-writing
+            it, skipping (without calculating) as many graphs as it has complete
+            rows. A partial last row, left by a run that was killed, is dropped.
+        batch : int, optional
+            collect this many graphs at a time, and hand them to functions that
+            have a .batch() version (i.e. the sp_* statistics in adjacency.py) all
+            at once. The graphs must then be independent of each other, like the
+            snapshots of rolled_adjacency_gen(), not the live rolled_window_gen().
+        reuse : bool, optional
+            when given the live window of rolled_window_gen(), reuse the previous
+            row as long as the window's contents have not changed (default True),
+            rather than calculating the same statistics again. Turn off for
+            functions that depend on more than what is in the window.
+        rle : bool, optional
+            write savename run-length encoded: each line is a row, prefixed by
+            the number of consecutive times it repeats. See read_stats().
+        quiet : bool, optional
+            don't print where the statistics are saved.
+
+    Time spent on statistics and on writing the output are recorded in the
+    metrics registry (see metrics.py), as 'stats.*' and 'output.write'.
     """
 
-    # statistics are in columns, observations in rows.
-    stats = np.array([[f(i) for f in funcs] for i in graph_gen])
-
     try:  # fail gracefully without savename.
         savename = kwargs['savename']
-        print 'saving to '+ savename
+        if not kwargs.get('quiet', False):
+            print 'saving to '+ savename
     except KeyError:
         savename = None
 
+    if kwargs.get('stream', False):
+        if savename is None:
+            raise ValueError('streaming g_stats() requires a savename')
+        return _stream_stats(graph_gen, funcs, savename,
+                             flush=kwargs.get('flush'),
+                             resume=kwargs.get('resume', False),
+                             batch=kwargs.get('batch'),
+                             reuse=kwargs.get('reuse', True),
+                             rle=kwargs.get('rle', False))
+
+    # statistics are in columns, observations in rows.
+    stats = _stats_array(list(_stat_rows(graph_gen, funcs, kwargs.get('batch'),
+                                         kwargs.get('reuse', True))))
+
     if savename is not None:  # allow output to file
-        np.savetxt(savename, stats, fmt='%.2f')
+        t = time.time()
+        if kwargs.get('rle', False) or stats.dtype == object:
+            with open(savename, 'w', 1 << 16) as out:
+                _write_rows(out, stats, rle=kwargs.get('rle', False))
+        else:
+            np.savetxt(savename, stats, fmt='%.2f')
+        if metrics.enabled:
+            metrics.observe('output.write', time.time() - t)
+    return stats
+
+
+def read_stats(savename, rle=False):
+    """
+    Read the statistics written by g_stats() back into an array, with one row
+    per window (expanding the runs of a run-length encoded file). Only for
+    numeric statistics.
+    """
+    stats = np.loadtxt(savename, ndmin=2)
+    if rle:
+        stats = np.repeat(stats[:, 1:], stats[:, 0].astype(np.int64), axis=0)
     return stats
+
+
+def _stats_array(rows):
+    """
+    Rows of statistics as an array, of objects if any are not numbers (i.e.
+    the lists of top_tags()).
+    """
+    if all(np.isscalar(x) for row in rows for x in row):
+        return np.array(rows)
+    stats = np.empty((len(rows), len(rows[0])), dtype=object)
+    for i, row in enumerate(rows):
+        for j, x in enumerate(row):
+            stats[i, j] = x
+    return stats
+
+
+def _stat_rows(graph_gen, funcs, batch=None, reuse=True):
+    """
+    Yields the row of statistics of each graph in graph_gen, calculating them
+    [batch] graphs at a time for functions that support it. See g_stats().
+    """
+    m = metrics if metrics.enabled else None
+    if not batch:
+        last, version, row = None, None, None
+        for i in graph_gen:
+            if reuse and isinstance(i, (RollingWindow, WindowSet)):
+                if i is last and i.version == version:  # nothing changed
+                    if m is not None:
+                        m.count('stats.reused')
+                    yield row
+                    continue
+                last, version = i, i.version
+            if m is not None:
+                t = time.time()
+            if isinstance(i, WindowSet):  # a column per window, for each function
+                row = i.stats(funcs)
+            else:
+                row = [f(i) for f in funcs]
+            if m is not None:
+                m.observe('stats.row', time.time() - t)
+            yield row
+        return
+
+    while True:
+        graphs = list(islice(graph_gen, batch))
+        if not graphs:
+            return
+        if m is not None:
+            t = time.time()
+        cols = [f.batch(graphs) if hasattr(f, 'batch') else [f(i) for i in graphs]
+                for f in funcs]
+        if m is not None:
+            m.observe('stats.batch', time.time() - t)
+        for row in zip(*cols):
+            yield list(row)
+
+
+def _stream_stats(graph_gen, funcs, savename, flush=None, resume=False, batch=None,
+                  reuse=True, rle=False):
+    """
+    Writes the statistics of each graph in graph_gen to savename as they are
+    calculated, in the same format as np.savetxt(fmt='%.2f'). See g_stats().
+    """
+    done = 0
+    if resume and os.path.exists(savename):
+        with open(savename, 'r+b') as f:  # rows written by the previous run
+            end = 0
+            for line in f:
+                if not line.endswith('\n'):  # cut off mid-line, i.e. the run was killed
+                    break
+                end += len(line)
+                done += int(line.split(None, 1)[0]) if rle else 1
+            f.truncate(end)  # rewrite any partial row
+        graph_gen = islice(graph_gen, done, None)
+
+    with open(savename, 'a' if resume else 'w', 1 << 16) as out:  # buffered
+        rows = _write_rows(out, _stat_rows(graph_gen, funcs, batch, reuse), rle, flush)
+    return done + rows
+
+
+def _write_rows(out, rows, rle=False, flush=None):
+    """
+    Writes rows of statistics to an open file as '%.2f' text, run-length
+    encoded or not, returning the number of rows. See g_stats().
+    """
+    m = metrics if metrics.enabled else None
+    n = 0
+    run, repeats = None, 0  # when run-length encoding, the current run
+    for row in rows:
+        if m is not None:
+            t = time.time()
+        line = ' '.join([_format(x) for x in row])
+        n += 1
+        if not rle:
+            out.write(line + '\n')
+        elif line == run:
+            repeats += 1
+        else:
+            if run is not None:
+                out.write('%d %s\n' % (repeats, run))
+            run, repeats = line, 1
+        if flush and not n % flush:
+            out.flush()
+        if m is not None:
+            m.observe('output.write', time.time() - t)
+    if run is not None:
+        out.write('%d %s\n' % (repeats, run))
+    return n
+
+
+def _format(x):
+    """
+    A statistic as '%.2f' text, an array of them (i.e. a degree distribution)
+    as 'n,n,...', or a top-k list as 'key:count,...' ('-' if empty).
+    """
+    try:
+        return '%.2f' % x
+    except TypeError:
+        if not len(x):
+            return '-'
+        if isinstance(x, np.ndarray):
+            return ','.join(['%g' % n for n in x])
+        return ','.join(['%s:%d' % (_key(key), n) for key, n in x])
+
+
+def _key(key):
+    """A hashtag (or pair of them, joined by '+') as UTF-8 text."""
+    if isinstance(key, tuple):
+        return '+'.join([_key(k) for k in key])
+    if isinstance(key, unicode):
+        return key.encode('utf-8')
+    return str(key)
@@ -0,0 +1,360 @@
+import numpy as np
+from bisect import bisect_right  # native to python
+from window import SET_TIME, ADD_NODE, REMOVE_NODE, ADD_EDGE, REMOVE_EDGE, _edge
+
+__author__ = 'tbsexton'
+"""
+HashStream's history module, for keeping the graph of every window of a
+tweet stream, at a fraction of the memory of a list of graphs.
+
+Consecutive windows differ by a handful of nodes and edges, so rather than a
+complete graph per window, a GraphHistory keeps the changes (delta) from each
+window to the next, as logged by the RollingWindow itself, plus a complete
+copy of the graph (keyframe) every so many windows. Any window's graph is then
+rebuilt on request, from the keyframe before it and the deltas in between,
+and stepping through the windows in order costs only their deltas.
+
+To ask about a point in time instead ("what were #foo's neighbors at
+17:52:30?"), an IntervalIndex turns a history into the intervals of windows
+during which each node and edge was alive, sorted per hashtag, and answers
+degree, neighborhood and whole-graph queries by bisection, without rebuilding
+or replaying any graphs.
+"""
+
+
+__all__ = ['GraphHistory', 'IntervalIndex']
+
+
+class GraphHistory(object):
+
+    def __init__(self, windows, keyframe=500):
+        """
+        Records the graph of every window yielded by a rolling window generator.
+
+        Parameters
+        ----------
+        windows : generator
+            rolled_window_gen(graph=True) iterable with desired bounds, yielding
+            the (live) RollingWindow.
+        keyframe : int
+            keep a complete copy of the graph every [keyframe] windows. Fewer
+            keyframes save memory, more make random access faster.
+
+        Returns
+        -------
+        self
+            a read-only, list-like history of the window graphs, with
+            attributes:
+
+            times : int64 array
+                'now' of each window (i.e. ns since the epoch, for windows of
+                rolled_window_gen())
+            deltas : list
+                changes to the graph since the previous window, for each window
+                (see window.py for the kinds of change)
+            keyframes : list
+                (time, [(node, time), ...], [edges]) of every [keyframe]-th graph
+        """
+        self.keyframe = keyframe
+        self.deltas = []
+        self.keyframes = []
+        times = []
+
+        for rw in windows:
+            if rw.graph is None:
+                raise ValueError('a GraphHistory needs windows with graphs')
+            if rw.changes is None:  # first window: all of it is new
+                delta = ()
+            else:
+                delta = tuple(rw.changes)
+            rw.changes = []
+            if not len(self.deltas) % keyframe:
+                G = rw.graph
+                nodes = [(node, dict(attr)) for node, attr in G.nodes(data=True)]
+                self.keyframes.append((G.graph['time'], nodes, list(G.edges())))
+            self.deltas.append(delta)
+            times.append(rw.now)
+        self.times = np.array(times, dtype=np.int64)
+        self._cursor = None  # (index, graph) of the window last rebuilt
+
+    def __len__(self):
+        """Number of windows."""
+        return len(self.deltas)
+
+    def __getitem__(self, i):
+        """
+        Graph of window i, rebuilt from the keyframe before it (or, if nearer,
+        the window last rebuilt). Returns an independent NetworkX graph.
+        """
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('window index out of range')
+        import networkx as nx
+        return nx.Graph(self._rebuild(i))
+
+    def __iter__(self):
+        """
+        Yields
+        ------
+        G: NetworkX graph object
+            graph of each window in turn, updated in place from one window to
+            the next (at the cost of its delta), so only valid until the next
+            step. Copy it (nx.Graph(G)) to keep it.
+        """
+        if not len(self):
+            return
+        G = self._keyframe(0)
+        yield G
+        for delta in self.deltas[1:]:
+            _apply(G, delta)
+            yield G
+
+    def _keyframe(self, k):
+        """Graph of keyframe k (i.e. of window k*keyframe)."""
+        import networkx as nx
+        time, nodes, edges = self.keyframes[k]
+        G = nx.Graph(time=time)
+        G.add_nodes_from(nodes)
+        G.add_edges_from(edges)
+        return G
+
+    def _rebuild(self, i):
+        """Graph of window i, kept (and returned) as the cursor."""
+        k = i // self.keyframe
+        cursor = self._cursor
+        if cursor is not None and k * self.keyframe <= cursor[0] <= i:  # step forward
+            j, G = cursor
+        else:
+            j, G = k * self.keyframe, self._keyframe(k)
+        for delta in self.deltas[j + 1:i + 1]:
+            _apply(G, delta)
+        self._cursor = (i, G)
+        return G
+
+
+def _apply(G, delta):
+    """Make a window's changes (see RollingWindow.changes) to graph G."""
+    for change in delta:
+        kind = change[0]
+        if kind == ADD_EDGE:
+            G.add_edge(change[1], change[2])
+        elif kind == ADD_NODE:
+            G.add_node(change[1], time=change[2])
+        elif kind == REMOVE_EDGE:
+            G.remove_edge(change[1], change[2])
+        elif kind == REMOVE_NODE:
+            G.remove_node(change[1])
+        elif kind == SET_TIME:
+            G.graph['time'] = change[1]
+
+
+class IntervalIndex(object):
+
+    def __init__(self, history):
+        """
+        Indexes when each hashtag and co-occurrence was in the window graph.
+
+        Parameters
+        ----------
+        history : GraphHistory
+            i.e. from get_graphs(lazy=True). Only read once, while indexing.
+
+        Returns
+        -------
+        self
+            an index object, for point-in-time queries of the windows' graphs.
+            Times may be anything Pandas takes as a Timestamp (e.g. '2016-03-24
+            17:52:30', a datetime, or ns since the epoch), in UTC, and refer to
+            the latest window at or before them (in which 'now' is the time of
+            the latest tweet received by then).
+
+        Notes
+        -----
+        Nodes and edges are alive for half-open intervals [i, j) of window
+        numbers. A node's degree at window i is then the number of its edges'
+        intervals starting at or before i, minus those ending at or before i,
+        i.e. two bisections of sorted arrays. Its neighbors, and the whole graph
+        of a window, are found with (static, centered) interval trees, at a cost
+        of log(no. of intervals) plus the size of the answer.
+        """
+        self.times = history.times
+        n = len(history)
+        node_iv, edge_iv, stamps = {}, {}, {}  # intervals; node --> ([window], [time])
+        clock = ([], [])  # graph 'time' from each window on
+        alive_nodes, alive_edges = {}, {}  # node or edge --> window it entered at
+
+        def add_node(node, stamp, i):
+            if node not in alive_nodes:
+                alive_nodes[node] = i
+            steps = stamps.get(node)
+            if steps is None:
+                steps = stamps[node] = ([], [])
+            steps[0].append(i)
+            steps[1].append(stamp)
+
+        def close(alive, intervals, key, i):
+            start = alive.pop(key)
+            if start < i:  # else, it came and went between windows
+                intervals.setdefault(key, []).append((start, i))
+
+        if n:
+            time, nodes, edges = history.keyframes[0]
+            clock[0].append(0)
+            clock[1].append(time)
+            for node, attr in nodes:
+                add_node(node, attr['time'], 0)
+            for u, v in edges:
+                alive_edges[_edge(u, v)] = 0
+        for i in xrange(1, n):
+            for change in history.deltas[i]:
+                kind = change[0]
+                if kind == ADD_EDGE:
+                    alive_edges[_edge(change[1], change[2])] = i
+                elif kind == ADD_NODE:
+                    add_node(change[1], change[2], i)
+                elif kind == REMOVE_EDGE:
+                    close(alive_edges, edge_iv, _edge(change[1], change[2]), i)
+                elif kind == REMOVE_NODE:
+                    close(alive_nodes, node_iv, change[1], i)
+                elif kind == SET_TIME:
+                    if clock[0][-1] == i:  # set again, within the same window
+                        clock[1][-1] = change[1]
+                    else:
+                        clock[0].append(i)
+                        clock[1].append(change[1])
+        for key, start in alive_edges.items():  # still alive at the end
+            close(alive_edges, edge_iv, key, n)
+        for key, start in alive_nodes.items():
+            close(alive_nodes, node_iv, key, n)
+
+        self.node_intervals = node_iv  # node --> [(start, stop) windows]
+        self.edge_intervals = edge_iv  # edge --> [(start, stop) windows]
+        self._stamps = stamps
+        self._clock = clock
+        incident = {}  # node --> [(start, stop, neighbor)]
+        for (u, v), intervals in edge_iv.iteritems():
+            for start, stop in intervals:
+                incident.setdefault(u, []).append((start, stop, v))
+                if u != v:
+                    incident.setdefault(v, []).append((start, stop, u))
+        self._degree = {}  # node --> (sorted starts, sorted stops), self-loops twice
+        for node, ivs in incident.iteritems():
+            loops = [(start, stop) for start, stop, other in ivs if other == node]
+            self._degree[node] = (np.sort([iv[0] for iv in ivs] + [iv[0] for iv in loops]),
+                                  np.sort([iv[1] for iv in ivs] + [iv[1] for iv in loops]))
+        self._incident = incident
+        self._trees = {}  # node --> tree of its edges' intervals, built when first asked
+        self._graph_trees = None  # trees of all nodes' and edges' intervals
+
+    def window_at(self, time):
+        """Number of the latest window at or before [time] (-1 if none)."""
+        import pandas as pd
+        t = pd.Timestamp(time).value  # ns since the epoch, in UTC
+        return int(np.searchsorted(self.times, t, side='right')) - 1
+
+    def degree(self, tag, time):
+        """Degree of a hashtag in the window graph at [time] (0 if not in it)."""
+        i = self.window_at(time)
+        try:
+            starts, stops = self._degree[tag]
+        except KeyError:
+            return 0
+        return int(np.searchsorted(starts, i, side='right') -
+                   np.searchsorted(stops, i, side='right'))
+
+    def neighbors(self, tag, time):
+        """Neighbors of a hashtag in the window graph at [time], as a list."""
+        tree = self._trees.get(tag)
+        if tree is None:
+            if tag not in self._incident:
+                return []
+            tree = self._trees[tag] = _IntervalTree(self._incident[tag])
+        return tree.stab(self.window_at(time))
+
+    def alive(self, tag, other=None):
+        """
+        When a hashtag (or, given another, the edge between them) was in the
+        window graph, as a list of (from, until) times (datetime64), until being
+        None if it still was at the end.
+        """
+        if other is None:
+            intervals = self.node_intervals.get(tag, [])
+        else:
+            intervals = self.edge_intervals.get(_edge(tag, other), [])
+        times, n = self.times.view('datetime64[ns]'), len(self.times)
+        return [(times[start], times[stop] if stop < n else None) for start, stop in intervals]
+
+    def graph(self, time):
+        """
+        The window graph at [time], as rolled_graph_gen() would have yielded it
+        (an empty graph before the first window).
+        """
+        import networkx as nx
+        if self._graph_trees is None:
+            self._graph_trees = (
+                _IntervalTree([(start, stop, node) for node, ivs in self.node_intervals.iteritems()
+                               for start, stop in ivs]),
+                _IntervalTree([(start, stop, edge) for edge, ivs in self.edge_intervals.iteritems()
+                               for start, stop in ivs]))
+        i = self.window_at(time)
+        if i < 0:
+            return nx.Graph(time=None)
+        nodes, edges = self._graph_trees
+        G = nx.Graph(time=_step(self._clock, i))
+        for node in nodes.stab(i):
+            G.add_node(node, time=_step(self._stamps[node], i))
+        G.add_edges_from(edges.stab(i))
+        return G
+
+
+def _step(steps, i):
+    """Value at window i of a step function, given as ([window], [value])."""
+    return steps[1][bisect_right(steps[0], i) - 1]
+
+
+class _IntervalTree(object):
+
+    def __init__(self, intervals):
+        """
+        Static centered interval tree, of a list of half-open (start, stop,
+        value) intervals, for finding all those containing a point.
+        """
+        self.root = self._build(intervals)
+
+    def _build(self, intervals):
+        """
+        Node of the tree: the intervals containing its center, by start and by
+        stop, and the subtrees of those entirely before and after it.
+        """
+        if not intervals:
+            return None
+        center = sorted(iv[0] for iv in intervals)[len(intervals) // 2]
+        here, before, after = [], [], []
+        for iv in intervals:
+            if iv[1] <= center:
+                before.append(iv)
+            elif iv[0] > center:
+                after.append(iv)
+            else:
+                here.append(iv)
+        by_start = sorted(here, key=lambda iv: iv[0])
+        by_stop = sorted(here, key=lambda iv: iv[1])
+        return (center, [iv[0] for iv in by_start], [iv[2] for iv in by_start],
+                [iv[1] for iv in by_stop], [iv[2] for iv in by_stop],
+                self._build(before), self._build(after))
+
+    def stab(self, point):
+        """Values of all intervals containing point."""
+        found = []
+        node = self.root
+        while node is not None:
+            center, starts, start_values, stops, stop_values, before, after = node
+            if point < center:  # those here that start by point
+                found.extend(start_values[:bisect_right(starts, point)])
+                node = before
+            else:  # those here that stop after point
+                found.extend(stop_values[bisect_right(stops, point):])
+                node = after
+        return found
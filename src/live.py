@@ -0,0 +1,320 @@
+import io
+import os
+import socket
+import sys
+import threading
+import time
+from Queue import Queue, Full, Empty  # native to python
+import cPickle as pickle
+from preprocess import _parse_fast, created_at_epoch, _fingerprint
+from window import RollingWindow
+from metrics import metrics
+
+__author__ = 'tbsexton'
+"""
+HashStream's live module, for continuously parsing incoming tweets "behind
+the scenes" and analyzing them as they arrive, rather than re-reading a file
+on request.
+
+A background thread reads newline-delimited tweet JSON from a source (stdin,
+a TCP or Unix socket, or a file being written to, as with `tail -f`) into a
+bounded queue. Iterating over the LiveStream parses each queued line, feeds
+it to a rolling window, and yields that window's statistics, just like a row
+of g_stats(). When the queue is full, the reader blocks, which pushes back on
+the source (e.g. through TCP flow control) rather than buffering without end.
+
+A stream can periodically write a checkpoint: a snapshot of its window (the
+tweets in it, its edge counts and degrees, and 'now'), and of how far into
+its source it got. A new LiveStream with the same checkpoint picks up from
+there, rather than replaying the source from the start to rebuild the window.
+"""
+
+
+__all__ = ['LiveStream']
+
+_EOF = object()  # queued by the reader once the source runs dry
+
+
+class LiveStream(object):
+
+    def __init__(self, source, *funcs, **kwargs):
+        """
+        Defines a live stream of tweets, and the statistics to calculate on its
+        rolling window.
+
+        Parameters
+        ----------
+        source : str or file
+            '-' for stdin, 'tcp://host:port' or 'unix:///path/to/socket' to connect
+            to a socket, any other str is the name of a file to follow (tail), or an
+            open file(-like) object to read lines from.
+        *funcs : function inputs
+            any set of functions that take in a RollingWindow and return a statistic
+            (i.e. mean_deg()).
+        **kwargs :
+            window : integer, float
+                rolling window size in sec (default 60.)
+            lateness : integer, float, optional
+                how many sec behind "now" an out-of-order tweet may be and still be
+                counted. Defaults to the window size.
+            components : bool
+                keep track of the window's connected components, for the
+                n_components() and giant_size() statistics (default False).
+            histogram : bool
+                keep a histogram of the window's node degrees, for the
+                degree_hist() statistic (default False).
+            maxsize : int
+                how many unparsed lines may be queued before the reader blocks
+                (default 10000).
+            poll : float
+                how many sec to wait for a followed file to grow (default 0.1).
+            from_start : bool
+                whether to follow a file from its beginning, or only new tweets
+                (default True).
+            checkpoint : str, optional
+                file to snapshot the stream's state to, every [interval] sec and
+                when it ends. If it already holds a snapshot (of the same file, when
+                following one), the stream resumes from it: with the same window,
+                and from the line after the last one it had read, instead of from
+                the start. Rows yielded after the last snapshot are yielded again
+                (the first .no_rows rows are those yielded before it). A snapshot of
+                a window with other settings (window, lateness, histogram or
+                components) raises ValueError.
+            interval : float
+                how many sec between checkpoints (default 60.).
+
+        Returns
+        -------
+        self
+            a stream object, which can be iterated over once.
+        """
+        self.source = source
+        self.funcs = funcs
+        self.window = RollingWindow(window=kwargs.get('window', 60.),
+                                    lateness=kwargs.get('lateness'), graph=False,
+                                    histogram=kwargs.get('histogram', False),
+                                    components=kwargs.get('components', False))
+        self.queue = Queue(maxsize=kwargs.get('maxsize', 10000))
+        self.poll = kwargs.get('poll', 0.1)
+        self.from_start = kwargs.get('from_start', True)
+        self.checkpoint = kwargs.get('checkpoint')
+        self.interval = kwargs.get('interval', 60.)
+        self.no_saved_tweets = 0  # keep track of the total number of tweets
+        self.no_file_errs = 0  # keep track of total number of dropped tweets
+        self.no_rows = 0  # number of rows yielded
+        self.offset = None  # byte after the last line read, when following a file
+        self._last_checkpoint = time.time()
+        self._stopped = threading.Event()
+        self._sock = None
+        self._reader = threading.Thread(target=self._read)
+        self._reader.daemon = True
+        if self.checkpoint is not None:
+            self._load_checkpoint()
+
+    def _is_file(self):
+        """Whether the source is the name of a file to follow."""
+        source = self.source
+        return (isinstance(source, basestring) and source != '-' and
+                not source.startswith(('tcp://', 'unix://')))
+
+    def _open(self):
+        """File-like object to read lines from, or None to follow a file."""
+        source = self.source
+        if not isinstance(source, basestring):
+            return source
+        if source == '-':
+            return sys.stdin
+        if source.startswith('tcp://'):
+            host, port = source[len('tcp://'):].rsplit(':', 1)
+            self._sock = socket.create_connection((host, int(port)))
+        elif source.startswith('unix://'):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.connect(source[len('unix://'):])
+        else:
+            return None
+        return self._sock.makefile('rb')
+
+    def _put(self, item):
+        """Queue an item, blocking while the queue is full (unless stopped)."""
+        while not self._stopped.is_set():
+            try:
+                self.queue.put(item, timeout=self.poll)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _follow(self):
+        """
+        Yield complete lines of a (growing) file, like `tail -f`, each with the
+        offset of the byte after it.
+        """
+        with io.open(self.source, 'rb') as f:
+            if self.offset is not None:  # resuming from a checkpoint
+                f.seek(self.offset)
+            elif not self.from_start:
+                f.seek(0, io.SEEK_END)
+            offset = f.tell()
+            partial = b''
+            while not self._stopped.is_set():
+                line = f.readline()
+                if not line:  # wait for more to be written
+                    time.sleep(self.poll)
+                    continue
+                partial += line
+                if partial.endswith(b'\n'):
+                    offset += len(partial)
+                    yield partial, offset
+                    partial = b''
+
+    def _read(self):
+        """Reader thread: move lines from the source into the queue."""
+        try:
+            f = self._open()
+            if f is None:
+                lines = self._follow()
+            else:  # no offsets to resume from
+                lines = ((line, None) for line in iter(f.readline, b''))
+            for item in lines:
+                if not self._put(item):
+                    break
+        except (IOError, socket.error):
+            if not self._stopped.is_set():
+                raise
+        finally:
+            self._put(_EOF)
+
+    def start(self):
+        """Start reading from the source in the background."""
+        if not self._reader.is_alive():
+            self._reader.start()
+        return self
+
+    def stop(self):
+        """Stop reading, ending the iteration once the queue is drained."""
+        self._stopped.set()
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def _save_checkpoint(self):
+        """Snapshot the window, and how far into the source it got (atomically)."""
+        state = {'window': self.window, 'offset': self.offset,
+                 'no_saved_tweets': self.no_saved_tweets, 'no_file_errs': self.no_file_errs,
+                 'no_rows': self.no_rows}
+        if self.offset is not None:  # to recognize the followed file
+            with io.open(self.source, 'rb') as f:
+                state['path'] = os.path.abspath(self.source)
+                state['print'] = _fingerprint(f, self.offset)
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'wb') as out:
+            pickle.dump(state, out, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, self.checkpoint)
+        self._last_checkpoint = time.time()
+
+    def _load_checkpoint(self):
+        """
+        Restore the state of an earlier stream from its checkpoint, unless it
+        followed a different file, or one that has since been truncated or
+        replaced. Returns True if it was restored.
+
+        Raises ValueError if the checkpointed window's settings differ from the
+        stream's, rather than silently using (or throwing away) either.
+        """
+        try:
+            with open(self.checkpoint, 'rb') as f:
+                state = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):  # missing or unreadable
+            return False
+
+        offset = state['offset']
+        if offset is not None:
+            if not self._is_file() or state['path'] != os.path.abspath(self.source):
+                return False
+            try:
+                with io.open(self.source, 'rb') as f:
+                    if (os.fstat(f.fileno()).st_size < offset or
+                            _fingerprint(f, offset) != state['print']):
+                        return False
+            except IOError:
+                return False
+
+        saved, wanted = _settings(state['window']), _settings(self.window)
+        if saved != wanted:
+            raise ValueError('checkpoint {} has (window, lateness, histogram, components) = {}, '
+                             'not {}'.format(self.checkpoint, saved, wanted))
+        self.window = state['window']
+        self.offset = offset
+        self.no_saved_tweets = state['no_saved_tweets']
+        self.no_file_errs = state['no_file_errs']
+        self.no_rows = state['no_rows']
+        return True
+
+    def __iter__(self):
+        """
+        Yields
+        ------
+        row : list
+            statistics of the window after each tweet, for all windows with at
+            least 2 hashtags (as in rolled_window_gen()).
+        """
+        self.start()
+        rw = self.window
+        funcs = self.funcs
+        checkpoint = self.checkpoint
+        try:
+            for row in self._rows(rw, funcs):
+                self.no_rows += 1
+                yield row
+                # the row was taken, so a snapshot from here on includes it
+                if checkpoint is not None and time.time() - self._last_checkpoint >= self.interval:
+                    self._save_checkpoint()
+        finally:
+            if checkpoint is not None:
+                self._save_checkpoint()
+
+    def _rows(self, rw, funcs):
+        """Statistics of the window after each tweet in the queue. See __iter__()."""
+        version, row = None, None
+        while True:
+            try:
+                item = self.queue.get(timeout=self.poll)
+            except Empty:
+                if self._stopped.is_set() and not self._reader.is_alive():
+                    return
+                continue
+            if item is _EOF:
+                return
+            line, offset = item
+            if offset is not None:
+                self.offset = offset
+            if not line.strip():  # i.e. keep-alive newlines
+                continue
+
+            try:
+                dat = _parse_fast(line)
+                if dat is not None:
+                    dat = created_at_epoch(dat[0]), dat[1]
+            except ValueError:  # malformed line, or unexpected timestamp
+                dat = None
+            if metrics.enabled:
+                metrics.count('parse.lines')
+                metrics.count('parse.tweets' if dat is not None else 'parse.dropped')
+                metrics.gauge('live.queue', self.queue.qsize())
+            if dat is None:
+                self.no_file_errs += 1
+                continue
+            self.no_saved_tweets += 1
+
+            rw.push(*dat)
+            if rw.n_nodes > 1:  # ignore it if size less than 2
+                if rw.version != version:  # else, the window is as it was
+                    row, version = [f(rw) for f in funcs], rw.version
+                yield row
+
+
+def _settings(rw):
+    """Settings of a RollingWindow that a checkpoint must have been made with."""
+    return rw.window, rw.lateness, rw.histogram is not None, rw.components is not None
@@ -1,5 +1,9 @@
+import argparse  # native to python
+import inspect
 from preprocess import Preprocess
-from analysis import *
+from analysis import (rolled_window_gen, g_stats, mean_deg, degree_hist, n_components,
+                      giant_size, top_tags, top_pairs)
+from metrics import metrics
 __author__ = 'tbsexton'
 
 """
@@ -14,20 +18,121 @@ Equivalent to:
     $ ./run.sh
 if the input is /tweet_input/tweets.txt and the output is
 /tweet_output/output.txt
+
+Other windows, tweet ranges and statistics can be given as options, e.g.
+    $ python src/main.py input.txt output.txt --window 30 --stats mean_deg nodes density
+    $ python src/main.py input.txt output.txt --window 60 300 3600
+    $ python src/main.py input.txt output.txt --stats tweets top_tags top_pairs --top 5
+See `python src/main.py --help` for all of them.
+
+Only what a run needs is imported: the default statistics are kept up to date by
+the rolling window itself, so neither NetworkX nor Pandas are loaded for them.
 """
 
-# def main():
 
+# statistics that a RollingWindow keeps track of, without building graphs
+WINDOW_STATS = {'mean_deg': mean_deg,
+                'nodes': lambda rw: rw.n_nodes,
+                'edges': lambda rw: rw.n_edges,
+                'tweets': len,
+                'components': n_components,
+                'giant': giant_size,
+                'degree_hist': degree_hist,
+                'top_tags': top_tags,
+                'top_pairs': top_pairs}
+TOP_STATS = ('top_tags', 'top_pairs')  # which need the window's Trending sketch
+COMPONENT_STATS = ('components', 'giant')  # which need its Components
+
+
+def _stat(name):
+    """
+    Statistic of a RollingWindow by name, from WINDOW_STATS, or else a NetworkX
+    function (i.e. 'density') applied to the window's graph. Raises ValueError
+    for any other name, including NetworkX classes (i.e. 'Graph') and values.
+    """
+    if name in WINDOW_STATS:
+        return WINDOW_STATS[name]
+    import networkx as nx
+    func = getattr(nx, name, None)
+    if name.startswith('_') or not inspect.isfunction(func):
+        raise ValueError('unknown statistic: {}'.format(name))
+    return lambda rw: func(rw.graph)
 
-if __name__ == '__main__':
-    import sys
-    print(sys.argv)
 
-    pre = Preprocess(sys.argv[1])
-    pre.extract()
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Rolling-window statistics of the hashtag graph of a tweet file.')
+    parser.add_argument('input', help='tweet file, one JSON object per line')
+    parser.add_argument('output', help='file to write one row of statistics per window to')
+    parser.add_argument('-w', '--window', type=float, nargs='+', default=[60.],
+                        help='rolling window size(s) in sec (default 60). Several sizes are '
+                             'rolled in one pass, with a column per statistic and size')
+    parser.add_argument('--bucket', type=float,
+                        help='aggregate windows into buckets of this many sec, to bound memory '
+                             'for long windows (window-only statistics)')
+    parser.add_argument('--start', type=int, default=0, help='tweet number to start at')
+    parser.add_argument('--stop', type=int, help='tweet number to stop before')
+    parser.add_argument('--lateness', type=float,
+                        help='sec an out-of-order tweet may be late (default: the window)')
+    parser.add_argument('-s', '--stats', nargs='+', default=['mean_deg'],
+                        help='columns to output: {} (without graphs), or the name of any '
+                             'NetworkX function of a graph, e.g. density'.format(
+                                 ', '.join(sorted(WINDOW_STATS))))
+    parser.add_argument('--top', type=int, default=10,
+                        help='no. of hashtags (pairs) listed by top_tags (top_pairs), as '
+                             'tag:count,... (default 10)')
+    parser.add_argument('--rle', action='store_true',
+                        help='run-length encode the output: each row is prefixed by its no. of repeats')
+    parser.add_argument('--cache', action='store_true',
+                        help='keep parsed tweets in <input>.cache.npz, to only parse new ones next time')
+    parser.add_argument('-p', '--processes', type=int,
+                        help='number of processes to parse with, and to calculate statistics '
+                             'with (in time shards, when starting from the first tweet)')
+    parser.add_argument('--metrics', metavar='PATH', help='dump metrics to PATH as JSON')
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args(argv)
+    graph = not all(s in WINDOW_STATS for s in args.stats)  # else degree stats only
+    if graph and args.bucket is not None:
+        parser.error('--bucket keeps no graphs, so only takes the statistics: {}'.format(
+            ', '.join(sorted(WINDOW_STATS))))
 
-    graph_gen = rolled_graph_gen(pre.df)
+    try:
+        funcs = [_stat(s) for s in args.stats]
+    except ValueError as e:
+        parser.error(str(e))
 
-    degrees = g_stats(graph_gen, mean_deg, savename=sys.argv[2])
+    if args.metrics:
+        metrics.enable(path=args.metrics)
 
+    pre = Preprocess(args.input, cache=args.cache or None)
+    pre.extract(processes=args.processes)
+    if not args.quiet:
+        print 'Parsed {:d} Tweets.'.format(pre.no_saved_tweets)
+        print 'Dropped {:d} Tweets with missing information.'.format(pre.no_file_errs)
 
+    window = args.window[0] if len(args.window) == 1 else args.window
+    top = args.top if any(s in TOP_STATS for s in args.stats) else None
+    components = any(s in COMPONENT_STATS for s in args.stats)
+    histogram = 'degree_hist' in args.stats
+    if args.processes and args.processes > 1 and not args.start:  # replay in parallel shards
+        from replay import replay_stats
+        no_rows = len(replay_stats(pre.store, *funcs, window=window, stop=args.stop,
+                                   graph=graph, lateness=args.lateness, bucket=args.bucket,
+                                   top=top, components=components, histogram=histogram,
+                                   processes=args.processes, savename=args.output,
+                                   rle=args.rle))
+    else:
+        window_gen = rolled_window_gen(pre.store, window=window, start=args.start,
+                                       stop=args.stop, graph=graph, lateness=args.lateness,
+                                       bucket=args.bucket, top=top, components=components,
+                                       histogram=histogram)
+        no_rows = g_stats(window_gen, *funcs, savename=args.output, stream=True, rle=args.rle,
+                          quiet=args.quiet)
+
+    if args.metrics:
+        metrics.disable()  # final dump
+    return no_rows
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import json
+import os
+import time
+
+__author__ = 'tbsexton'
+"""
+HashStream's metrics module, for measuring what the rest of HashStream is
+doing while it runs: parse times and rates, dropped tweets, the size of the
+rolling window, evictions, statistic latency, output write time, etc.
+
+There is one registry, `metrics`, which the other modules record into, and
+which is disabled (costing a single attribute check per tweet) until
+
+    >>> from metrics import metrics
+    >>> metrics.enable(path='metrics.json', interval=10.)
+
+after which every record is kept, passed on to any hooks (callbacks), and
+the whole registry is dumped as JSON to [path] every [interval] sec.
+
+Records come in three kinds, by dotted name:
+    counters    running totals, e.g. 'parse.tweets'
+    gauges      latest value, e.g. 'window.nodes'
+    timers      count/total/max of durations in sec, e.g. 'stats.row'
+"""
+
+
+__all__ = ['Metrics', 'metrics']
+
+
+class Metrics(object):
+
+    def __init__(self):
+        """
+        Defines an (empty, disabled) registry of metrics.
+
+        Returns
+        -------
+        self
+            a registry object, with attributes:
+
+            enabled : bool
+                whether anything should be recorded. Instrumented code checks
+                this before doing any work for the registry.
+            counters, gauges : dict
+                name --> value
+            timers : dict
+                name --> [count, total sec, max sec]
+            hooks : list
+                functions called as hook(kind, name, value) on every record
+        """
+        self.enabled = False
+        self.counters = {}
+        self.gauges = {}
+        self.timers = {}
+        self.hooks = []
+        self.path = None
+        self.interval = None
+        self._last_dump = None
+
+    def enable(self, path=None, interval=10., hooks=()):
+        """
+        Start recording.
+
+        Parameters
+        ----------
+        path : str, optional
+            file to periodically dump all metrics to, as JSON.
+        interval : float
+            how many sec between dumps to [path].
+        hooks : list of functions, optional
+            called as hook(kind, name, value) on every record, where kind is
+            'counter', 'gauge' or 'timer' (value is the increment, new value, or
+            duration in sec, respectively).
+        """
+        self.path = path
+        self.interval = interval
+        self._last_dump = time.time()
+        for hook in hooks:
+            self.add_hook(hook)
+        self.enabled = True
+        return self
+
+    def disable(self):
+        """Stop recording (and write a final dump, if dumping)."""
+        if self.enabled and self.path is not None:
+            self.dump()
+        self.enabled = False
+
+    def reset(self):
+        """Forget all recorded values (but keep hooks and settings)."""
+        self.counters.clear()
+        self.gauges.clear()
+        self.timers.clear()
+
+    def add_hook(self, hook):
+        if hook not in self.hooks:
+            self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        if hook in self.hooks:
+            self.hooks.remove(hook)
+
+    def count(self, name, n=1):
+        """Add n to counter [name]."""
+        self.counters[name] = self.counters.get(name, 0) + n
+        self._emit('counter', name, n)
+
+    def gauge(self, name, value):
+        """Set gauge [name] to value."""
+        self.gauges[name] = value
+        self._emit('gauge', name, value)
+
+    def observe(self, name, secs):
+        """Record a duration of [secs] in timer [name]."""
+        t = self.timers.get(name)
+        if t is None:
+            self.timers[name] = [1, secs, secs]
+        else:
+            t[0] += 1
+            t[1] += secs
+            if secs > t[2]:
+                t[2] = secs
+        self._emit('timer', name, secs)
+
+    def _emit(self, kind, name, value):
+        """Pass a record on to the hooks, and dump if it's been a while."""
+        for hook in self.hooks:
+            hook(kind, name, value)
+        if self.path is not None and time.time() - self._last_dump >= self.interval:
+            self.dump()
+
+    def report(self):
+        """
+        All metrics, as a JSON-able dict with 'counters', 'gauges' and 'timers'
+        (each with count, total, mean and max sec), and the time of the report.
+        """
+        timers = dict((name, {'count': c, 'total': s, 'mean': s / c, 'max': m})
+                      for name, (c, s, m) in self.timers.items())
+        return {'time': time.time(), 'counters': dict(self.counters),
+                'gauges': dict(self.gauges), 'timers': timers}
+
+    def dump(self, path=None):
+        """Write report() to [path] (default the one given to enable()), atomically."""
+        path = path or self.path
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+        os.rename(tmp, path)
+        self._last_dump = time.time()
+
+
+metrics = Metrics()  # the registry HashStream records into
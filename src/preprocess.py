@@ -1,5 +1,14 @@
-import pandas as pd
+import numpy as np
 import json  # in standard Python
+import os
+import re
+import hashlib
+import glob
+import time
+from calendar import timegm
+from json.decoder import scanstring
+from store import TweetStore
+from metrics import metrics
 
 __author__ = 'tbsexton'
 
@@ -16,10 +25,223 @@ continuously parse incoming tweets, but only re-calculate the graphs when
 requested, and so on.
 """
 
+_decoder = json.JSONDecoder()
+_TWEET_PREFIX = '{"created_at":"'  # how every tweet object from the API starts
+_HASHTAGS_KEY = '"entities":{"hashtags":['
+_NESTED_KEYS = ('"retweeted_status":', '"quoted_status":', '"extended_tweet":')
+# API messages other than tweets, e.g. {"limit":{"track":1,"timestamp_ms":"..."}}: compact
+# objects of plain ASCII strings, integers and literals, or arrays or objects of them.
+_VALUE = r'(?:"[ !#-\[\]-~]*"|-?(?:0|[1-9][0-9]*)|true|false|null)'
+_VALUE = r'(?:{0}|\[(?:{0}(?:,{0})*)?\])'.format(_VALUE)
+for _ in range(2):  # objects nested up to 3 deep, as in delete messages
+    _VALUE = r'(?:{0}|\{{(?:"\w+":{0}(?:,"\w+":{0})*)?\}})'.format(_VALUE)
+_MESSAGE = re.compile(r'\{{"\w+":{0}(?:,"\w+":{0})*\}}[ \t\n\r]*\Z'.format(_VALUE))
 
-class Preprocess:
 
-    def __init__(self, fname):
+_MONTHS = dict((m, i + 1) for i, m in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']))
+_epoch_cache = {}  # created_at string --> epoch seconds
+_SEPARATORS = (3, 7, 10, 13, 16, 19, 25)  # positions of ' ' and ':' in created_at
+_CACHE_SIZE = 100000  # thousands of tweets share each second, few seconds recur
+_PRINT_SPAN = 1 << 16  # bytes at each end of the parsed data to fingerprint
+_MAX_SEGMENTS = 64  # cache segments to keep before merging them into the cache
+
+
+def created_at_epoch(stamp):
+    """
+    Decodes a tweet's 'created_at' string, which always has Twitter's fixed
+    format, e.g. "Thu Mar 24 17:51:10 +0000 2016", into (integer) seconds since
+    the UNIX epoch. Results are memoized by string.
+
+    Raises ValueError if the string is not in this format.
+    """
+    try:
+        return _epoch_cache[stamp]
+    except KeyError:
+        pass
+
+    #  Thu Mar 24 17:51:10 +0000 2016
+    #  0123456789012345678901234567890
+    if len(stamp) != 30 or ''.join(stamp[i] for i in _SEPARATORS) != '   ::  ':
+        raise ValueError('not a Twitter timestamp: {!r}'.format(stamp))
+    try:
+        month = _MONTHS[stamp[4:7]]
+    except KeyError:
+        raise ValueError('not a Twitter timestamp: {!r}'.format(stamp))
+    offset = int(stamp[21:23]) * 3600 + int(stamp[23:25]) * 60
+    if stamp[20] == '-':
+        offset = -offset
+    secs = timegm((int(stamp[26:30]), month, int(stamp[8:10]),
+                   int(stamp[11:13]), int(stamp[14:16]), int(stamp[17:19]))) - offset
+
+    if len(_epoch_cache) >= _CACHE_SIZE:
+        _epoch_cache.clear()
+    _epoch_cache[stamp] = secs
+    return secs
+
+
+def _parse_full(line):
+    """
+    Parse a whole JSON line, returning its (created_at, hashtags), or None if
+    the object lacks the desired keys (i.e. rate-limit messages).
+    """
+    dat = json.loads(line)  # store tweet in dict
+    try:  # if desired data exists, extract it
+        return dat[u'created_at'], [i[u'text'] for i in dat[u'entities'][u'hashtags']]
+    except KeyError:
+        return None
+
+
+def _parse_fast(line):
+    """
+    Same as _parse_full(), but only decodes the timestamp and the hashtag
+    array of a tweet, instead of the whole (several KB) object.
+
+    Rate-limit and delete messages (any flat object without "created_at", in
+    the compact layout of the API) are rejected without parsing at all. Any
+    other line not laid out as expected, that is not a complete object (i.e.
+    cut short), or that has nested tweets (retweets, quotes, extended tweets)
+    with their own entities, falls back to a full parse, and so raises
+    ValueError on malformed JSON just as _parse_full() does.
+
+    Only the timestamp and hashtags of a tweet are decoded, so a line that is
+    corrupt elsewhere but still a complete object is read as a tweet, where
+    _parse_full() would raise. Use Preprocess.extract(fast=False) to check
+    every line.
+    """
+    if not line.startswith(_TWEET_PREFIX):
+        if '"created_at":' not in line and _MESSAGE.match(line):
+            return None
+        return _parse_full(line)
+
+    end = line.rstrip(' \t\n\r')
+    if not end.endswith('}') or line.count('{') != line.count('}') \
+            or line.count('[') != line.count(']'):  # not one whole object
+        return _parse_full(line)
+    start = line.find(_HASHTAGS_KEY)
+    if start < 0 or line.find(_HASHTAGS_KEY, start + 1) >= 0:
+        return _parse_full(line)
+    for key in _NESTED_KEYS:
+        if key in line:
+            return _parse_full(line)
+
+    # '{"created_at":"' and '"entities":{"hashtags":[' can only be keys,
+    # since quotes inside JSON strings are always escaped.
+    created_at, end = scanstring(line, len(_TWEET_PREFIX))
+    if line[end] != ',':
+        return _parse_full(line)
+    hashtags, end = _decoder.raw_decode(line, start + len(_HASHTAGS_KEY) - 1)
+    if line[end] not in ',}':
+        return _parse_full(line)
+    try:
+        return created_at, [i[u'text'] for i in hashtags]
+    except (KeyError, TypeError):
+        return _parse_full(line)
+
+
+def _fingerprint(f, offset):
+    """
+    SHA-1 digests of the first and last (up to) 64 KB of the first [offset] bytes
+    of open file [f], to recognize the same data in a later run.
+    """
+    f.seek(0)
+    head = hashlib.sha1(f.read(min(offset, _PRINT_SPAN))).hexdigest()
+    f.seek(max(0, offset - _PRINT_SPAN))
+    tail = hashlib.sha1(f.read(offset - f.tell())).hexdigest()
+    return head, tail
+
+
+def _parse_range(fname, start=0, end=None, fast=True):
+    """
+    Parses all lines of a file between two byte offsets.
+
+    Parameters
+    ----------
+    fname : str
+        name of tweet file (with path).
+    start : int
+        byte offset to start from, at the beginning of a line.
+    end : int, optional
+        byte offset to stop at, at the beginning of a line. Defaults to the end
+        of the file.
+    fast : bool
+        whether to use _parse_fast() or _parse_full() on each line.
+
+    Returns
+    -------
+    times, tags : lists
+        timestamps and hash-tag lists of the tweets found
+    er_no : int
+        number of dropped lines (lacking desired keys)
+    offset : int
+        byte offset just past the last complete line parsed
+    """
+    parse = _parse_fast if fast else _parse_full
+    times = []
+    tags = []
+    er_no = 0
+    offset = start
+
+    with open(fname, 'rb') as f:
+        f.seek(start)
+        for tweet in f:
+            if end is not None and offset >= end:
+                break
+
+            if not tweet.endswith('\n'):  # last line, possibly half-written
+                try:
+                    dat = _parse_full(tweet)  # make sure it is complete
+                except ValueError:
+                    break  # leave it for next time
+            else:
+                if not tweet.strip():  # skip blank lines
+                    offset += len(tweet)
+                    continue
+                dat = parse(tweet)
+            offset += len(tweet)
+
+            '''
+            We want to only gather metrics on human tweets (i.e. no rate-limit messages)
+            As implemented here, tweets without the desired keys will fail gracefully
+            and be tracked. '''
+            if dat is None:
+                #  count up all exceptions to give to user
+                er_no += 1
+                continue
+            times += [dat[0]]
+            tags += [dat[1]]
+    return times, tags, er_no, offset
+
+
+def _parse_chunk(job):
+    """Pool-friendly _parse_range(), taking its arguments as one tuple."""
+    return _parse_range(*job)
+
+
+def _chunk_bounds(f, start, end, n):
+    """
+    Splits the bytes [start, end) of open file [f] into (at most) n ranges that
+    each begin at the start of a line. Returns the n+1 (or fewer) boundaries,
+    with None as the last one, so that the last range reads to the end of file.
+    """
+    bounds = [start]
+    for k in range(1, n):
+        pos = start + (end - start) * k // n
+        if pos <= bounds[-1]:
+            continue
+        f.seek(pos - 1)
+        f.readline()  # move on to the next line start, at or after pos
+        pos = f.tell()
+        if pos >= end:
+            break
+        if pos > bounds[-1]:
+            bounds.append(pos)
+    return bounds + [None]
+
+
+class Preprocess(object):
+
+    def __init__(self, fname, cache=None):
         """
         Defines the pre-processing object, and the filename it will
         monitor, usually with the <../tweet_input/> directory as prefix.
@@ -28,6 +250,9 @@ class Preprocess:
         ----------
         fname : str
             name of tweet file (with path).
+        cache : bool or str, optional
+            file to keep the parsed tweets in between runs (True for
+            <fname>.cache.npz), so unchanged input needn't be parsed again.
 
         Returns
         -------
@@ -38,11 +263,16 @@ class Preprocess:
         self.input_file = fname  # file to track
         self.source = fname  # store name of data source file
         # self.dat = {}  # dict to access all tweet data if needed
-        self.times = []  # timestamp of tweets
-        self.tags = []  # list of hash-tag lists in the tweets
+        self.store = TweetStore()  # timestamps and interned hash-tags of tweets
         self.no_saved_tweets = 0  # keep track of the total number of tweets
         self.no_file_errs = 0  # keep track of total number of dropped tweets
-        self.df = pd.DataFrame()
+        self._df = None  # DataFrame view of the store, built on request
+        self._tags = None  # hash-tag lists decoded from the store, on request
+        self.offset = 0  # byte offset just past the last complete line parsed
+        self._file_id = None  # (device, inode) of the file last parsed
+        self._head = ''  # first bytes of the file last parsed
+        self.cache = fname + '.cache.npz' if cache is True else cache or None
+        self._saved = None  # (offset, tweets, tags, tweets before segments, segments) cached
 
     @staticmethod
     def get_dataframe(times, tags):
@@ -56,11 +286,150 @@ class Preprocess:
         and other R-like functions for stats.
 
         """
+        import pandas as pd  # Pandas is only imported when it is needed
         dic = {"time": pd.to_datetime(times),
                "hashtags": tags}
         return pd.DataFrame(data=dic)
 
-    def extract(self, overwrite = True):
+    @staticmethod
+    def to_utc(times):
+        """
+        Convert tweet 'created_at' strings to an array of UTC datetime64's.
+
+        Notes
+        -----
+        Uses created_at_epoch() rather than having Pandas infer the format, and
+        only falls back to Pandas for timestamps that aren't in Twitter's format.
+        """
+        try:
+            epoch = np.array([created_at_epoch(t) for t in times], dtype=np.int64)
+            return epoch.astype('datetime64[s]').astype('datetime64[ns]')
+        except ValueError:
+            pass
+        import pandas as pd
+        return pd.to_datetime(times, utc=True).tz_localize(None).values
+
+    @property
+    def times(self):
+        """
+        (UTC) datetime64[ns] array of the tweets' timestamps.
+
+        Notes
+        -----
+        This used to be a list of the tweets' 'created_at' strings. Use to_utc() to
+        convert such strings, or df.time (or store.stamp()) for Pandas Timestamps.
+        """
+        return self.store.times
+
+    @property
+    def tags(self):
+        """
+        List of hash-tag lists in the tweets, decoded from the store on first
+        request after each extraction.
+        """
+        if self._tags is None:
+            self._tags = [self.store.hashtags(i) for i in range(len(self.store))]
+        return self._tags
+
+    @property
+    def df(self):
+        """
+        DF object of the tweets, as from get_dataframe(), for compatibility.
+        Built from the store on first request after each extraction.
+        """
+        if self._df is None:
+            self._df = self.store.to_dataframe()
+        return self._df
+
+    def _same_file(self, f):
+        """
+        Whether open file [f] is still the file that was last parsed, i.e. it
+        has not been truncated, or rotated (replaced by a new file).
+        """
+        stat = os.fstat(f.fileno())
+        if stat.st_size < self.offset:  # truncated
+            return False
+        if self._file_id is not None and self._file_id != (stat.st_dev, stat.st_ino):
+            return False
+        f.seek(0)
+        return f.read(len(self._head)) == self._head
+
+    def _segment(self, offset):
+        """Name of the cache segment holding the tweets parsed from byte [offset] on."""
+        return '{}.{:d}'.format(self.cache, offset)
+
+    def _load_cache(self, f):
+        """
+        Restore the tweets parsed by an earlier run from the cache, if it was made
+        from this file: same path, and same first and last bytes of the parsed
+        data. Unless the file has grown since (i.e. tweets were appended), its
+        size and modification time must match too.
+
+        The cache is followed by the segments, if any, that later runs appended
+        (see _save_cache()), each named by the byte offset it picks up at.
+
+        Returns True if the cache was loaded.
+        """
+        try:
+            store, extra = TweetStore.load(self.cache)
+            offset, base, segments = int(extra['offset']), len(store), 0
+            while os.path.exists(self._segment(offset)):
+                store, extra = TweetStore.load(self._segment(offset), store)
+                offset, segments = int(extra['offset']), segments + 1
+        except (IOError, OSError, ValueError, KeyError):  # missing or unreadable
+            return False
+
+        stat = os.fstat(f.fileno())
+        if (extra['path'] != os.path.abspath(self.input_file) or
+                stat.st_size < offset or
+                (stat.st_size == extra['size'] and stat.st_mtime != extra['mtime']) or
+                _fingerprint(f, offset) != (extra['head'], extra['tail'])):
+            return False
+
+        self.store = store
+        self.no_saved_tweets = int(extra['no_saved_tweets'])
+        self.no_file_errs = int(extra['no_file_errs'])
+        self.offset = offset
+        self._file_id = (stat.st_dev, stat.st_ino)
+        f.seek(0)
+        self._head = f.read(min(offset, 256))
+        self._df = None
+        self._tags = None
+        self._saved = (offset, len(store), len(store.vocab), base, segments)
+        return True
+
+    def _save_cache(self, f, start):
+        """
+        Write the parsed tweets to the cache (atomically), see _load_cache().
+
+        If the cache holds the tweets before byte [start], only those parsed since
+        are written, to a new segment next to it, so that each incremental
+        extraction costs in proportion to what it added. The cache and its segments
+        are merged (rewritten as one file) once the segments hold as many tweets
+        as the cache, or number _MAX_SEGMENTS.
+        """
+        stat = os.fstat(f.fileno())
+        head, tail = _fingerprint(f, self.offset)
+        saved = self._saved
+        if (saved is None or saved[0] != start or saved[4] >= _MAX_SEGMENTS or
+                len(self.store) - saved[3] > saved[3]):
+            name, tweets, tags, base, segments = self.cache, 0, 0, len(self.store), 0
+            for old in glob.glob(self.cache + '.[0-9]*'):
+                os.remove(old)  # stale once the cache is rewritten
+        else:
+            name, tweets, tags, base, segments = (self._segment(start), saved[1], saved[2],
+                                                  saved[3], saved[4] + 1)
+        tmp = name + '.tmp'
+        with open(tmp, 'wb') as out:
+            self.store.save(out, tweets, tags, path=os.path.abspath(self.input_file),
+                            size=stat.st_size, mtime=stat.st_mtime,
+                            head=head, tail=tail, offset=self.offset,
+                            no_saved_tweets=self.no_saved_tweets,
+                            no_file_errs=self.no_file_errs)
+        os.rename(tmp, name)
+        self._saved = (self.offset, len(self.store), len(self.store.vocab), base, segments)
+
+    def extract(self, overwrite = True, fast = True, processes = None):
         """
         Extracts all desired data from the monitored file.
 
@@ -68,65 +437,103 @@ class Preprocess:
         ----------
         overwrite : bool
             whether to maintain tweets in current storage or rewrite from beginning of file.
+        fast : bool
+            whether to only decode the timestamp and hashtags of each tweet, rather
+            than the whole JSON object. Gives the same results, much faster.
+        processes : int, optional
+            number of worker processes to parse with. The new part of the file is
+            split into as many newline-aligned chunks, which are parsed in parallel
+            and merged back in line order, with the same results as a serial run.
 
         Notes
         -----
         It can over-write current data, ensuring re-do's are possible on a file-level.
 
+        Without overwriting, parsing picks up at the byte offset where the last
+        extraction stopped, so only newly written tweets are read. If the file has
+        since been truncated or rotated, it is re-parsed from the beginning.
+
+        A final line without a newline that is not (yet) valid JSON is assumed to
+        still be being written, and is left for the next extraction.
+
+        With a cache, a run over a file that was parsed before only loads the cached
+        tweets, and parses whatever has been appended to the file since. Only those
+        new tweets are written back, to a cache segment (see _save_cache()).
+
         Exctraction fails gracefully on tweets lacking desired keys (i.e. rate-limit messages, etc.)
+
+        Parse time and counts of parsed/dropped tweets are recorded in the metrics
+        registry (see metrics.py), as 'parse.*'.
         """
 
-        if overwrite:
-            # resets all __init__ vars.
-            # self.dat = {}  # clear all saved tweets from this stream
-            self.times = []  # reset timestamps
-            self.tags = []  # reset hash-tags
-            self.no_saved_tweets = 0
-            self.no_file_errs = 0
-            self.df = pd.DataFrame()
+        m = metrics if metrics.enabled else None
+        with open(self.input_file, 'rb') as f:
+            if not overwrite and not self._same_file(f):
+                overwrite = True  # file was truncated or replaced
+                if m is not None:
+                    m.count('parse.restarts')
+
+            cached = overwrite and self.cache is not None and self._load_cache(f)
+            if cached:
+                overwrite = False
+                if m is not None:
+                    m.count('parse.cached_tweets', self.no_saved_tweets)
+
+            if overwrite:
+                # resets all __init__ vars.
+                # self.dat = {}  # clear all saved tweets from this stream
+                self.store = TweetStore()  # reset timestamps and hash-tags
+                self.no_saved_tweets = 0
+                self.no_file_errs = 0
+                self.offset = 0
+                self._saved = None  # the cache no longer holds the start of the store
+
+            stat = os.fstat(f.fileno())
+            self._file_id = (stat.st_dev, stat.st_ino)
 
-        with open(self.input_file, 'r') as f:
             # initialize
-            er_no = 0
-            tweet_no = 0
-            new_times = []
-            new_tags = []
-            print 'Parsing JSON objects...'
-
-            # loop over tweets
-            for n, tweet in enumerate(f):
-
-                if n <= self.no_saved_tweets + self.no_file_errs and (not overwrite):
-                    continue  # file has been written before --> skip old tweets and errs
-
-                dat = json.loads(tweet)  # store tweet in dict
-
-                '''
-                We want to only gather metrics on human tweets (i.e. no rate-limit messages)
-                As implemented here, tweets without the desired keys will fail gracefully
-                and be tracked. '''
-                try:  # if desired data exists, extract it
-                    new_times += [dat[u'created_at']]
-                    new_tags += [[i[u'text'] for i in dat[u'entities'][u'hashtags']]]
-
-                    tweet_no += 1
-                except KeyError:
-                    #  count up all exceptions to give to user
-                    er_no += 1
-                    pass
+            start = offset = self.offset  # skip straight past tweets and errs parsed before
+            t0 = time.time()
+
+            if processes is not None and processes > 1:
+                bounds = _chunk_bounds(f, offset, stat.st_size, processes)
+                jobs = [(self.input_file, a, b, fast) for a, b in zip(bounds[:-1], bounds[1:])]
+                from multiprocessing import Pool
+                pool = Pool(processes)
+                try:
+                    chunks = pool.map(_parse_chunk, jobs)  # in original line order
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                chunks = [_parse_range(self.input_file, offset, None, fast)]
+
+            new_times = [t for chunk in chunks for t in chunk[0]]
+            new_tags = [t for chunk in chunks for t in chunk[1]]
+            tweet_no = len(new_times)
+            er_no = sum(chunk[2] for chunk in chunks)
+            offset = chunks[-1][3]
 
             # update class definitions with new data entry
+            self.offset = offset
+            f.seek(0)
+            self._head = f.read(min(offset, 256))
             self.no_saved_tweets += tweet_no
             self.no_file_errs += er_no
-            self.times += new_times
-            self.tags += new_tags
-            new_df = self.get_dataframe(new_times, new_tags)
-            self.df = self.df.append(new_df)
-
-            print 'Done!'
-            print 'Parsed {:d} Tweets.'.format(tweet_no)
-            print 'Dropped {:d} Tweets with missing information.'.format(er_no)
-        print "Total tweets in storage: {:d}".format(self.no_saved_tweets)
+            self.store.append(self.to_utc(new_times), new_tags)
+            self._df = None
+            self._tags = None
+            if self.cache is not None and (tweet_no or er_no or not cached):
+                self._save_cache(f, start)
+
+        if m is not None:
+            secs = time.time() - t0
+            m.observe('parse.extract', secs)
+            m.count('parse.lines', tweet_no + er_no)
+            m.count('parse.tweets', tweet_no)
+            m.count('parse.dropped', er_no)
+            m.gauge('parse.lines_per_sec', (tweet_no + er_no) / secs if secs else 0.)
+            m.gauge('store.tweets', self.no_saved_tweets)
 
 
 
@@ -0,0 +1,209 @@
+import mmap
+import os
+import numpy as np
+from preprocess import Preprocess, _parse_fast, _parse_full, _fingerprint
+from store import TweetStore
+
+__author__ = 'tbsexton'
+"""
+HashStream's reader module, for random access into a (large) tweet file
+without parsing all of it first.
+
+The file is memory-mapped, and indexed once: the byte range and timestamp of
+every tweet line are recorded (rate-limit messages and the like are left
+out), and saved next to the file as <fname>.idx.npz. From then on, tweet N or
+all tweets in a time range can be found in the index, and only those lines
+are read and parsed. The OS pages in just the parts of the file touched, so
+memory use does not grow with the size of the file.
+"""
+
+
+__all__ = ['TweetReader']
+
+
+class TweetReader(object):
+
+    def __init__(self, fname, index=True):
+        """
+        Defines a reader over a tweet file, and builds (or loads) its index.
+
+        Parameters
+        ----------
+        fname : str
+            name of tweet file (with path).
+        index : bool or str
+            file to persist the index in (True for <fname>.idx.npz), or False
+            to keep it in memory only.
+
+        Returns
+        -------
+        self
+            a reader object, with attributes:
+
+            starts, ends : int64 arrays
+                byte range of each tweet's line in the file
+            times : datetime64[ns] array
+                (UTC) timestamp of each tweet
+            offset : int
+                byte offset just past the last complete line indexed
+            no_file_errs : int
+                number of dropped lines (lacking desired keys)
+        """
+        self.input_file = fname
+        self.index = fname + '.idx.npz' if index is True else index or None
+        self.starts = np.empty(0, dtype=np.int64)
+        self.ends = np.empty(0, dtype=np.int64)
+        self.times = np.empty(0, dtype='datetime64[ns]')
+        self.offset = 0
+        self.no_file_errs = 0
+        self._mm = None
+        self.refresh()
+
+    def __len__(self):
+        """Number of tweets in the index."""
+        return len(self.starts)
+
+    def __getitem__(self, n):
+        """(timestamp, hash-tag list) of tweet n."""
+        return self.times[n], _parse_fast(self.line(n))[1]
+
+    def line(self, n):
+        """Raw JSON line of tweet n, read straight from the memory map."""
+        return self._mm[self.starts[n]:self.ends[n]]
+
+    def close(self):
+        """Release the memory map."""
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def refresh(self):
+        """
+        (Re-)map the file, and bring the index up to date: load it from disk if
+        it still matches the file, and index any lines appended since.
+        """
+        self.close()
+        with open(self.input_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._load_index(f, size)
+            if size < self.offset:  # file was truncated, so start over
+                self.starts, self.ends = self.starts[:0], self.ends[:0]
+                self.times = self.times[:0]
+                self.offset = self.no_file_errs = 0
+            if size > self.offset:
+                self._extend(size)
+                if self.index is not None:
+                    self._save_index(f, size)
+
+    def _load_index(self, f, size):
+        """Restore a saved index, if it was made from this file. See Preprocess."""
+        if self.index is None or len(self):
+            return False
+        try:
+            with np.load(self.index) as arrays:
+                saved = dict((k, arrays[k]) for k in arrays.files)
+        except (IOError, OSError, ValueError):  # missing or unreadable
+            return False
+
+        offset = int(saved['offset'])
+        if (size < offset or
+                (size == saved['size'] and os.fstat(f.fileno()).st_mtime != saved['mtime']) or
+                _fingerprint(f, offset) != (saved['head'], saved['tail'])):
+            return False
+
+        self.starts, self.ends = saved['starts'], saved['ends']
+        self.times = saved['times'].view('datetime64[ns]')
+        self.offset = offset
+        self.no_file_errs = int(saved['no_file_errs'])
+        return True
+
+    def _save_index(self, f, size):
+        """Write the index to disk (atomically)."""
+        head, tail = _fingerprint(f, self.offset)
+        tmp = self.index + '.tmp'
+        with open(tmp, 'wb') as out:
+            np.savez(out, starts=self.starts, ends=self.ends,
+                     times=self.times.view(np.int64), offset=self.offset,
+                     no_file_errs=self.no_file_errs, size=size,
+                     mtime=os.fstat(f.fileno()).st_mtime, head=head, tail=tail)
+        os.rename(tmp, self.index)
+
+    def _extend(self, size):
+        """Index the complete lines between self.offset and size."""
+        mm = self._mm
+        pos = self.offset
+        starts, ends, stamps = [], [], []
+        er_no = 0
+        while pos < size:
+            end = mm.find('\n', pos)
+            if end < 0:  # last line, possibly half-written
+                end = size
+                try:
+                    dat = _parse_full(mm[pos:end])  # make sure it is complete
+                except ValueError:
+                    break  # leave it for next time
+                nxt = end
+            else:
+                nxt = end + 1
+                line = mm[pos:end]
+                dat = _parse_fast(line) if line.strip() else False  # as in _parse_range()
+
+            if dat is None:
+                er_no += 1
+            elif dat:  # i.e. not a blank line
+                starts.append(pos)
+                ends.append(end)
+                stamps.append(dat[0])
+            pos = nxt
+
+        self.starts = np.concatenate([self.starts, np.array(starts, dtype=np.int64)])
+        self.ends = np.concatenate([self.ends, np.array(ends, dtype=np.int64)])
+        self.times = np.concatenate([self.times, Preprocess.to_utc(stamps)])
+        self.no_file_errs += er_no
+        self.offset = pos
+
+    def between(self, t0, t1):
+        """
+        Tweet numbers of all tweets with timestamps in [t0, t1], which can be
+        datetime64's, or anything np.datetime64() accepts (in UTC).
+        """
+        t0, t1 = np.datetime64(t0, 'ns'), np.datetime64(t1, 'ns')
+        return np.flatnonzero((self.times >= t0) & (self.times <= t1))
+
+    def store(self, tweets=None):
+        """
+        Parse only the given tweets into a TweetStore.
+
+        Parameters
+        ----------
+        tweets : slice or array of ints, optional
+            tweet numbers to parse (default all).
+        """
+        n = np.arange(len(self))[tweets if tweets is not None else slice(None)]
+        store = TweetStore()
+        store.append(self.times[n], [_parse_fast(self.line(i))[1] for i in n])
+        return store
+
+    def window_slice(self, start=0, stop=None, window=60.):
+        """
+        Parse just enough tweets to roll a window of [window] sec over tweets
+        start to stop, i.e. those tweets and any earlier tweets that can still
+        be in the window when it reaches tweet [start].
+
+        Returns
+        -------
+        store : TweetStore
+        start, stop : int
+            where tweets start to stop ended up in store, for rolled_window_gen().
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = min(start, stop)
+        if start < stop:
+            cutoff = self.times[start] - np.timedelta64(int(round(window * 1e9)), 'ns')
+            early = np.flatnonzero(self.times[:start] >= cutoff)
+        else:
+            early = np.empty(0, dtype=np.int64)
+        tweets = np.concatenate([early, np.arange(start, stop)])
+        return self.store(tweets), len(early), len(tweets)
@@ -0,0 +1,98 @@
+import numpy as np
+from analysis import rolled_window_gen, _stat_rows, _stats_array, _write_rows
+from metrics import metrics
+from reader import TweetReader
+
+__author__ = 'tbsexton'
+"""
+HashStream's replay module, for backfilling the statistics of a large archive
+of tweets on several cores at once.
+
+The tweets are split into contiguous shards, and each shard is rolled over in
+its own process. A worker first warms its window up with the tweets before
+its shard that a serial run would still be holding there (see
+rolled_window_gen(warm=True)), so the per-shard statistics, put back
+together, are exactly those of a single serial run.
+"""
+
+
+__all__ = ['replay_stats']
+
+_shared = {}  # data for the worker processes, which inherit it when forked
+
+
+def _replay_shard(bounds):
+    """Worker: statistics of all windows between tweets start and stop."""
+    start, stop = bounds
+    df, funcs, kwargs = _shared['df'], _shared['funcs'], _shared['kwargs']
+    windows = rolled_window_gen(df, start=start, stop=stop, warm=True, **kwargs)
+    return list(_stat_rows(windows, funcs, reuse=_shared['reuse']))
+
+
+def replay_stats(df, *funcs, **kwargs):
+    """
+    Same as g_stats(rolled_window_gen(df, ...), *funcs), calculated in parallel.
+
+    Parameters
+    ----------
+    df : Pandas DataFrame object, TweetStore, or TweetReader
+        contains tweet hashtag lists and timestamps
+    *funcs : function inputs
+        any set of functions that take in a RollingWindow (or, with graph=True,
+        use its .graph) and return a statistic. They are shared with the
+        workers by forking, so need not be picklable.
+    **kwargs :
+        window, stop, lateness, graph, bucket, top, components, histogram :
+            as for rolled_window_gen() (which always starts at the first tweet).
+        processes : int, optional
+            number of worker processes (default: one per CPU).
+        shards : int, optional
+            number of shards to split the tweets into (default 4 per process,
+            to even out the load).
+        savename : string, optional
+            file to write the statistics to, as with g_stats().
+        reuse, rle : bool, optional
+            as with g_stats().
+
+    Returns
+    -------
+    stats : NumPy array
+        a row of statistics per window, in the same order as a serial run.
+    """
+    from multiprocessing import Pool, cpu_count
+
+    if isinstance(df, TweetReader):
+        df = df.store()
+    processes = kwargs.pop('processes', None) or cpu_count()
+    shards = kwargs.pop('shards', None) or 4 * processes
+    savename = kwargs.pop('savename', None)
+    reuse = kwargs.pop('reuse', True)
+    rle = kwargs.pop('rle', False)
+
+    stop = kwargs.pop('stop', None)
+    n = len(df) if stop is None else min(stop, len(df))
+    bounds = np.linspace(0, n, shards + 1).astype(int)
+    jobs = [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+    _shared.update(df=df, funcs=funcs, kwargs=kwargs, reuse=reuse)
+    try:
+        if processes > 1:
+            pool = Pool(processes)
+            try:
+                chunks = pool.map(_replay_shard, jobs, chunksize=1)  # in shard order
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            chunks = map(_replay_shard, jobs)
+    finally:
+        _shared.clear()
+
+    stats = _stats_array([row for chunk in chunks for row in chunk])
+    if metrics.enabled:
+        metrics.count('replay.shards', len(jobs))
+
+    if savename is not None:
+        with open(savename, 'w', 1 << 16) as out:
+            _write_rows(out, stats, rle=rle)
+    return stats
@@ -0,0 +1,406 @@
+import numpy as np
+from itertools import combinations  # native to python
+from heapq import heapify, heappush, heappop, nlargest
+from math import ceil, e, log
+from window import _edge
+
+__author__ = 'tbsexton'
+"""
+HashStream's sketch module, for tracking the most frequent ("trending")
+hashtags and hashtag pairs of a rolling window in bounded memory, without
+building or sorting graphs.
+
+Each window is split into fixed time buckets (as in a BucketedWindow), and
+two summaries are kept of every bucket:
+
+    a Count-Min sketch, a few rows of counters indexed by hashes of the key,
+    which estimates how often any key was counted. It only ever overestimates,
+    and sketches with the same hash functions add and subtract exactly, so the
+    window's sketch is kept as the running sum of its buckets' sketches.
+
+    a Space-Saving summary, which keeps (approximate) counts of at most
+    [capacity] keys, replacing the least frequent one when a new key comes in.
+    It is only used to know which keys may be frequent, i.e. candidates.
+
+Error bounds, for a window in which N hashtags (or pairs) were counted:
+
+    the count of any key is overestimated by at most epsilon*N, with a
+    probability of at least 1-delta (and never underestimated).
+
+    a key counted more than N/capacity times in the window was counted more
+    than N_b/capacity times in at least one of its buckets b, so it is always
+    among the candidates that the top k are picked from.
+
+As with a BucketedWindow, a bucket expires once all of it is older than the
+window, so counts may include up to one bucket's width of older tweets.
+"""
+
+
+__all__ = ['CountMinSketch', 'SpaceSaving', 'HeavyHitters', 'Trending']
+
+_PRIME = (1 << 31) - 1  # modulus of the sketch's hash functions
+
+
+class CountMinSketch(object):
+
+    def __init__(self, epsilon=0.001, delta=0.01, seed=0):
+        """
+        Defines an (empty) Count-Min sketch.
+
+        Parameters
+        ----------
+        epsilon : float
+            counts are overestimated by at most epsilon times the total count...
+        delta : float
+            ...except with a probability of at most delta.
+        seed : int
+            picks the hash functions. Only sketches with the same seed (and
+            epsilon, delta) can be added to or subtracted from each other.
+
+        Returns
+        -------
+        self
+            a sketch object, with a table of ceil(e/epsilon) counters for each
+            of ceil(ln(1/delta)) hash functions.
+        """
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = int(ceil(e / epsilon))
+        self.depth = int(ceil(log(1. / delta)))
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=(self.depth, 1)).astype(np.int64)
+        self._b = rng.randint(0, _PRIME, size=(self.depth, 1)).astype(np.int64)
+        self._rows = np.arange(self.depth, dtype=np.int64)[:, None] * self.width
+        self.table = np.zeros(self.depth * self.width, dtype=np.int32)  # rows back-to-back
+        self.total = 0  # sum of all counts
+
+    def empty(self):
+        """An empty sketch with the same hash functions."""
+        sk = object.__new__(CountMinSketch)
+        sk.__dict__.update(self.__dict__)
+        sk.table = np.zeros_like(self.table)
+        sk.total = 0
+        return sk
+
+    def cells(self, keys):
+        """Counter of each key in each row, as a (depth, len(keys)) array."""
+        h = np.array([hash(key) & 0x7fffffff for key in keys], dtype=np.int64)
+        return (self._a * h + self._b) % _PRIME % self.width + self._rows
+
+    def add(self, cells):
+        """Count each key (given by its cells()) once."""
+        np.add.at(self.table, cells.ravel(), 1)
+        self.total += cells.shape[1]
+
+    def subtract(self, other):
+        """Remove the counts of another sketch (with the same hash functions)."""
+        self.table -= other.table
+        self.total -= other.total
+
+    def estimate(self, cells):
+        """Estimated count of each key (given by its cells())."""
+        return self.table[cells].min(axis=0)
+
+
+class SpaceSaving(object):
+
+    def __init__(self, capacity=100):
+        """
+        Defines an (empty) Space-Saving summary.
+
+        Parameters
+        ----------
+        capacity : int
+            most keys to keep counts of.
+
+        Returns
+        -------
+        self
+            a summary object, with attributes:
+
+            counts : dict
+                key --> count, an overestimate of the true count
+            errors : dict
+                key --> most the count may be overestimated by
+        """
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._heap = []  # (count, key), including out-of-date counts
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, key):
+        return key in self.counts
+
+    def add(self, key):
+        """Count a key, taking the place of the least counted key if full."""
+        counts = self.counts
+        n = counts.get(key)
+        if n is None:
+            if len(counts) < self.capacity:
+                n = 0
+            else:  # the new key inherits the smallest count, as its error
+                n, old = self._pop_min()
+                del counts[old]
+                del self.errors[old]
+            self.errors[key] = n
+        counts[key] = n + 1
+
+        heap = self._heap
+        heappush(heap, (n + 1, key))
+        if len(heap) > 4 * self.capacity:  # drop the out-of-date entries
+            heap[:] = [(c, k) for k, c in counts.iteritems()]
+            heapify(heap)
+
+    def _pop_min(self):
+        """Least counted key (and its count), popped from the heap."""
+        heap, counts = self._heap, self.counts
+        while True:
+            n, key = heappop(heap)
+            if counts.get(key) == n:
+                return n, key
+
+
+class HeavyHitters(object):
+
+    def __init__(self, window, bucket, k=10, capacity=None, epsilon=0.001, delta=0.01,
+                 seed=0):
+        """
+        Defines an (empty) tracker of the k most frequent keys in a rolling
+        window.
+
+        Parameters
+        ----------
+        window, bucket : integer, float
+            rolling window size, and width of its buckets, in the same units
+            as the times that will be added (see BucketedWindow).
+        k : int
+            number of most frequent keys to report.
+        capacity : int, optional
+            keys kept by each bucket's Space-Saving summary (default 10*k).
+            Any key with more than 1/capacity of the window's counts is found.
+        epsilon, delta, seed :
+            as for CountMinSketch.
+
+        Returns
+        -------
+        self
+            a tracker object, whose top() is kept up to date as keys are added
+            and buckets expire.
+        """
+        self.window = window
+        self.bucket = bucket
+        self.k = k
+        self.capacity = capacity or 10 * k
+        self.sketch = CountMinSketch(epsilon, delta, seed)  # sum of the live buckets
+        self._buckets = {}  # index --> (CountMinSketch, SpaceSaving), for live buckets
+        self._oldest = None  # index of the oldest bucket that may be in the window
+        self._candidates = {}  # key --> estimated count, for keys that may be top
+        self._top = []  # (estimated count, key) of the top k, largest first
+
+    @property
+    def total(self):
+        """Number of keys counted in the window (N)."""
+        return self.sketch.total
+
+    @property
+    def error(self):
+        """Most any count is overestimated by (with probability 1-delta)."""
+        return self.sketch.epsilon * self.sketch.total
+
+    def top(self):
+        """The k most frequent keys, as a list of (key, estimated count)."""
+        return [(key, n) for n, key in self._top]
+
+    def advance(self, now):
+        """
+        Expire all buckets entirely older than [window] before [now],
+        returning whether any did.
+        """
+        oldest = int((now - self.window) // self.bucket)
+        if self._oldest is None:
+            self._oldest = oldest
+        if oldest <= self._oldest:
+            return False
+
+        buckets = self._buckets
+        if oldest - self._oldest > len(buckets):  # big jump, check the few buckets kept
+            expired = [k for k in buckets if k < oldest]
+        else:
+            expired = [k for k in xrange(self._oldest, oldest) if k in buckets]
+        for k in expired:
+            self.sketch.subtract(buckets.pop(k)[0])
+        self._oldest = oldest
+        if expired:
+            self._rebuild()
+        return bool(expired)
+
+    def add(self, time, keys, track=True):
+        """
+        Count each of a list of (distinct) keys once, at [time]. Keys in an
+        expired bucket are not counted. Unless [track], the candidates and top
+        k are left as they are, until the next _rebuild().
+        """
+        k = int(time // self.bucket)
+        if self._oldest is not None and k < self._oldest:
+            return False
+        bucket = self._buckets.get(k)
+        if bucket is None:
+            bucket = self._buckets[k] = (self.sketch.empty(), SpaceSaving(self.capacity))
+        summary = bucket[1]
+
+        cells = self.sketch.cells(keys)
+        self.sketch.add(cells)
+        bucket[0].add(cells)
+        if not track:
+            for key in keys:
+                summary.add(key)
+            return True
+        candidates = self._candidates
+        for key, n in zip(keys, self.sketch.estimate(cells).tolist()):
+            summary.add(key)
+            candidates[key] = n
+            self._offer(n, key)
+        if len(candidates) > 2 * self.capacity * len(self._buckets):  # keys evicted since
+            self._rebuild()
+        return True
+
+    def _last_expiry(self, times, counted, keyed):
+        """
+        Position in [times] (in order of arrival) of the tweet at which the
+        latest of the buckets expired so far did, or -1 if none has, for a
+        tracker advanced to the latest of them. [counted] is a mask of the
+        tweets that were counted, and keyed(j) whether tweet j had any keys.
+        """
+        k = times // self.bucket
+        oldest = (np.maximum.accumulate(times) - self.window) // self.bucket  # as each arrived
+        gone = np.flatnonzero(counted & (k >= oldest) & (k < self._oldest))
+        for j in gone[np.argsort(-k[gone], kind='mergesort')]:  # latest bucket first
+            if keyed(j):
+                return np.searchsorted(oldest, k[j], side='right')
+        return -1
+
+    def _offer(self, n, key):
+        """Update the top k with a key's new (larger) estimated count."""
+        top = self._top
+        for i, (_, other) in enumerate(top):
+            if other == key:
+                del top[i]
+                break
+        if len(top) < self.k or (n, key) > top[-1]:
+            top.append((n, key))
+            top.sort(reverse=True)
+            del top[self.k:]
+
+    def _rebuild(self):
+        """
+        Re-estimate the counts of all keys in the live buckets' summaries, and
+        pick the top k from them again.
+        """
+        keys = set()
+        for _, summary in self._buckets.itervalues():
+            keys.update(summary.counts)
+        keys = list(keys)
+        counts = self.sketch.estimate(self.sketch.cells(keys)).tolist() if keys else []
+        self._candidates = dict(zip(keys, counts))
+        self._top = nlargest(self.k, zip(counts, keys))
+
+
+class Trending(object):
+
+    def __init__(self, window, bucket, k=10, capacity=None, epsilon=0.001, delta=0.01,
+                 vocab=None):
+        """
+        Defines an (empty) tracker of the most frequent hashtags and hashtag
+        pairs in a rolling window, which can be given to a RollingWindow (as
+        its .sketch) to be kept up to date with the tweets in the window.
+
+        Parameters
+        ----------
+        window, bucket, k, capacity, epsilon, delta :
+            as for HeavyHitters, for both hashtags and pairs.
+        vocab : list, optional
+            hashtag of each id, when the hashtags inserted are ids (as in a
+            TweetStore), to report hashtags rather than ids.
+
+        Returns
+        -------
+        self
+            a tracker object, counting the number of tweets in the window with
+            each hashtag (.tags) and with each pair of hashtags (.pairs).
+        """
+        self.tags = HeavyHitters(window, bucket, k, capacity, epsilon, delta, seed=0)
+        self.pairs = HeavyHitters(window, bucket, k, capacity, epsilon, delta, seed=1)
+        self.vocab = vocab
+
+    def advance(self, now):
+        """Expire buckets older than the window, returning whether any did."""
+        expired = self.tags.advance(now)
+        return self.pairs.advance(now) or expired
+
+    def insert(self, time, tags):
+        """Count a tweet's (distinct) hashtags and pairs of hashtags."""
+        tags = set(tags)
+        if not tags:
+            return
+        self.tags.add(time, list(tags))
+        pairs = [_edge(u, v) for u, v in combinations(tags, 2)]
+        if pairs:
+            self.pairs.add(time, pairs)
+
+    def warm_up(self, times, tags, counted):
+        """
+        Count the tweets received before some point, as a run from the first
+        of them would have, for a sketch advanced to the latest of them.
+
+        Parameters
+        ----------
+        times : array
+            timestamp of each tweet, in order of arrival.
+        tags : list
+            hashtags of each tweet.
+        counted : array
+            boolean mask of the tweets that the window counted, i.e. with
+            hashtags, and not dropped for being late.
+
+        Notes
+        -----
+        The counts only depend on the tweets in the live buckets, but which
+        keys are candidates (and their estimates) depend on when they were
+        last rebuilt, i.e. the last time a bucket expired. So the tweets
+        before then are only counted, then the candidates rebuilt, and the
+        rest added as they came, for the same top k as a run from the start.
+        """
+        times = np.asarray(times)
+        tag_keys = lambda j: list(set(tags[j]))
+        pair_keys = lambda j: [_edge(u, v) for u, v in combinations(set(tags[j]), 2)]
+        for hh, keys in ((self.tags, tag_keys), (self.pairs, pair_keys)):
+            last = hh._last_expiry(times, counted, lambda j: len(keys(j)) > 0)
+            live = np.flatnonzero(counted & (times // hh.bucket >= hh._oldest))
+            split = np.searchsorted(live, last) if last >= 0 else 0
+            for j in live[:split]:
+                keys_j = keys(j)
+                if keys_j:
+                    hh.add(times[j], keys_j, track=False)
+            if last >= 0:
+                hh._rebuild()
+            for j in live[split:]:
+                keys_j = keys(j)
+                if keys_j:
+                    hh.add(times[j], keys_j)
+
+    def top_tags(self):
+        """The k most frequent hashtags, as a list of (hashtag, estimated count)."""
+        vocab = self.vocab
+        if vocab is None:
+            return self.tags.top()
+        return [(vocab[tag], n) for tag, n in self.tags.top()]
+
+    def top_pairs(self):
+        """The k most frequent pairs, as a list of ((hashtag, hashtag), estimated count)."""
+        vocab = self.vocab
+        if vocab is None:
+            return self.pairs.top()
+        return [((vocab[u], vocab[v]), n) for (u, v), n in self.pairs.top()]
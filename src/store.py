@@ -0,0 +1,162 @@
+import numpy as np
+
+__author__ = 'tbsexton'
+"""
+HashStream's storage module, which holds parsed tweets in a compact,
+array-backed layout rather than as Python lists of unicode lists.
+
+Every distinct hashtag is interned once in a vocabulary, and given an int32
+id. The hashtags of all tweets are then stored back-to-back in one flat id
+array, with a second array of offsets marking where each tweet's hashtags
+begin and end (the same layout as the rows of a CSR sparse matrix). Tweet
+times are kept in a datetime64 array, so the whole store costs a few bytes
+per hashtag, and can be sliced and compared without boxing any objects.
+"""
+
+
+__all__ = ['TweetStore']
+
+
+class TweetStore(object):
+
+    def __init__(self):
+        """
+        Defines an empty store of tweets.
+
+        Returns
+        -------
+        self
+            a store object, with attributes:
+
+            vocab : list
+                hashtag of each id
+            tag_id : dict
+                id of each hashtag
+            times : datetime64[ns] array
+                (UTC) timestamp of each tweet
+            ids : int32 array
+                hashtag ids of all tweets, back-to-back
+            offsets : int64 array
+                tweet i's hashtag ids are ids[offsets[i]:offsets[i+1]]
+        """
+        self.vocab = []
+        self.tag_id = {}
+        self.times = np.empty(0, dtype='datetime64[ns]')
+        self.ids = np.empty(0, dtype=np.int32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    def __len__(self):
+        """Number of tweets in the store."""
+        return len(self.offsets) - 1
+
+    def intern(self, tag):
+        """Id of a hashtag, adding it to the vocabulary if it is new."""
+        i = self.tag_id.get(tag)
+        if i is None:
+            i = self.tag_id[tag] = len(self.vocab)
+            self.vocab.append(tag)
+        return i
+
+    def append(self, times, tags):
+        """
+        Add a batch of tweets to the end of the store.
+
+        Parameters
+        ----------
+        times : array-like of datetime64
+            (UTC) timestamp of each tweet
+        tags : list
+            hash-tag list of each tweet
+        """
+        intern = self.intern
+        new_ids = np.array([intern(tag) for tweet in tags for tag in tweet],
+                           dtype=np.int32)
+        lengths = np.array([len(tweet) for tweet in tags], dtype=np.int64)
+
+        self.times = np.concatenate([self.times,
+                                     np.asarray(times, dtype='datetime64[ns]')])
+        self.offsets = np.concatenate([self.offsets,
+                                       self.offsets[-1] + np.cumsum(lengths)])
+        self.ids = np.concatenate([self.ids, new_ids])
+
+    def tag_ids(self, i):
+        """Hashtag ids of tweet i (a view, not a copy)."""
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def hashtags(self, i):
+        """Hashtags of tweet i, as a list of unicode strings."""
+        vocab = self.vocab
+        return [vocab[j] for j in self.tag_ids(i)]
+
+    def stamp(self, i):
+        """Timestamp of tweet i, as a (UTC) Pandas Timestamp."""
+        import pandas as pd  # Pandas is only imported when it is needed
+        return pd.Timestamp(self.times[i], tz='UTC')
+
+    def to_dataframe(self):
+        """
+        Return a DF object, as from Preprocess.get_dataframe(), that is indexed
+        in the order that tweets arrived, with timestamp and hashtag-list columns.
+        """
+        import pandas as pd
+        dic = {"time": pd.DatetimeIndex(self.times).tz_localize('UTC'),
+               "hashtags": [self.hashtags(i) for i in range(len(self))]}
+        return pd.DataFrame(data=dic)
+
+    def save(self, f, tweets=0, tags=0, **extra):
+        """
+        Write the store's arrays (and any extra arrays/values) to a NumPy .npz
+        file, or open file object.
+
+        Given the numbers of tweets and of vocabulary entries already saved
+        (e.g. by an earlier save()), only the tweets and hashtags added since are
+        written, to be appended to a store of the rest by load().
+        """
+        offsets = self.offsets[tweets:]
+        np.savez(f, times=self.times[tweets:].view(np.int64),
+                 ids=self.ids[offsets[0]:], offsets=offsets - offsets[0],
+                 vocab=np.array(self.vocab[tags:], dtype=np.unicode_), **extra)
+
+    @classmethod
+    def load(cls, f, store=None):
+        """
+        Read a store written by save().
+
+        Given a store, the saved tweets are appended to it instead, i.e. when
+        they were saved with save(f, tweets=len(store), tags=len(store.vocab)).
+
+        Returns
+        -------
+        store : TweetStore
+        extra : dict
+            any extra arrays/values that were saved along with it.
+        """
+        with np.load(f) as arrays:
+            extra = dict((k, arrays[k]) for k in arrays.files)
+        times = extra.pop('times').view('datetime64[ns]')
+        ids = extra.pop('ids')
+        offsets = extra.pop('offsets')
+        vocab = extra.pop('vocab').tolist()
+        if store is None:
+            store = cls()
+        store.times = np.concatenate([store.times, times])
+        store.offsets = np.concatenate([store.offsets, store.offsets[-1] + offsets[1:]])
+        store.ids = np.concatenate([store.ids, ids])
+        store.tag_id.update((tag, i) for i, tag in enumerate(vocab, len(store.vocab)))
+        store.vocab.extend(vocab)
+        return store, extra
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        Create a store from a DF object with timestamp and hashtag-list columns,
+        i.e. from Preprocess.get_dataframe().
+        """
+        import pandas as pd
+        times = pd.DatetimeIndex(df.time)
+        if times.tz is not None:
+            times = times.tz_convert('UTC').tz_localize(None)
+
+        store = cls()
+        store.append(times.values, df.hashtags.tolist())
+        return store
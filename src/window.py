@@ -0,0 +1,703 @@
+from itertools import combinations  # native to python
+from heapq import heappush, heappop
+from collections import deque
+
+__author__ = 'tbsexton'
+"""
+HashStream's window module, which keeps the hashtag co-occurrence graph of
+a rolling time window up to date one tweet at a time.
+
+Rather than re-slicing the tweet DataFrame and composing a fresh graph for
+every new tweet, the window remembers how many of its tweets contain each
+edge and each node. A new tweet only adds its own clique, and tweets that
+fall out of the window only remove theirs, so the per-tweet cost depends on
+the hashtags entering and leaving the window, not on the size of the window.
+
+The window also keeps a running count of each node's degree, so statistics
+like the mean degree come out in constant time, and can be tracked without
+building a NetworkX graph at all (graph=False).
+
+Most tweets have fewer than two hashtags, and change nothing in the window
+unless they also push old tweets out of it. The window's version number only
+moves when its contents do, so anything computed from an earlier window with
+the same version (e.g. a row of g_stats()) can be reused as-is.
+
+Time is tracked by event time: 'now' is a watermark at the latest tweet time
+received so far, and never moves backward. Tweets arriving out of order are
+late, and are still counted as long as they are within the allowed lateness
+(by default, the whole window) of 'now'; otherwise they are dropped. Tweets
+in the window sit in a min-heap by time, so evicting expired ones costs the
+same however out of order the stream is.
+
+For very long windows (hours, days), a BucketedWindow keeps no tweets at all,
+only the edge counts of each fixed span of time (bucket) within the window.
+Its memory is bounded by the number of buckets times the distinct edges in
+each, and whole buckets expire at once, at the cost of some precision at the
+trailing edge of the window.
+
+A window can keep track of its graph's connected components as edges come
+and go (components=True), so their number and sizes are always at hand
+without searching the whole graph. See Components.
+
+Either kind of window can also be given a sketch (see sketch.py), which is
+fed the same tweets as the window, and those with a single hashtag, to keep
+track of its most frequent hashtags and pairs as it goes.
+"""
+
+
+__all__ = ['RollingWindow', 'BucketedWindow', 'WindowSet', 'Components']
+
+
+# kinds of change to a window's graph, as logged to RollingWindow.changes
+SET_TIME, ADD_NODE, REMOVE_NODE, ADD_EDGE, REMOVE_EDGE = range(5)
+
+
+def _edge(u, v):
+    """Order-independent key for the (undirected) edge between u and v."""
+    return (u, v) if u <= v else (v, u)
+
+
+class Components(object):
+
+    def __init__(self):
+        """
+        Defines the (empty) connected components of a graph that edges are
+        added to and removed from one at a time.
+
+        Returns
+        -------
+        self
+            a components object, with attributes:
+
+            adj : dict
+                node --> set of neighbours, for all nodes with an edge
+            component : dict
+                node --> label of its component
+            members : dict
+                label --> set of nodes in the component
+            sizes : dict
+                component size --> no. of components that size
+
+        Notes
+        -----
+        Adding an edge merges its nodes' components, relabelling the nodes of
+        the smaller one (as in union-find by size), so each node is relabelled
+        at most log2(n) times as components grow.
+
+        Removing an edge searches outward from both of its nodes at once, a
+        step at a time each. If the searches meet, the component is still
+        connected. If one runs out of nodes first, what it reached splits off
+        as a new component. Either way, the cost depends on the smaller side,
+        not on the size of the component; in hashtag graphs, whose popular
+        tags connect most others, the searches tend to meet within a few steps.
+        """
+        self.adj = {}
+        self.component = {}
+        self.members = {}
+        self.sizes = {}
+        self._label = 0  # next new component label
+
+    def __len__(self):
+        """Number of connected components."""
+        return len(self.members)
+
+    def largest(self):
+        """Number of nodes in the largest (giant) component."""
+        return max(self.sizes) if self.sizes else 0
+
+    def add_edge(self, u, v):
+        """Add an edge, merging the components of its nodes."""
+        for x in (u, v):
+            if x not in self.component:  # new node, in a component of its own
+                self.adj[x] = set()
+                self._new_component(set([x]))
+        self.adj[u].add(v)
+        self.adj[v].add(u)
+
+        a, b = self.component[u], self.component[v]
+        if a == b:
+            return
+        members = self.members
+        if len(members[a]) < len(members[b]):
+            a, b = b, a
+        moved = members.pop(b)
+        self._resize(len(moved), None)
+        self._resize(len(members[a]), len(members[a]) + len(moved))
+        component = self.component
+        for x in moved:
+            component[x] = a
+        members[a] |= moved
+
+    def remove_edge(self, u, v):
+        """Remove an edge, splitting its component if it was a bridge."""
+        adj = self.adj
+        adj[u].discard(v)
+        adj[v].discard(u)
+        lone = [x for x in set((u, v)) if not adj[x]]
+        for x in lone:  # nodes without edges leave the graph
+            del adj[x]
+            self._remove_node(x)
+        if lone or u == v:  # the rest stays connected
+            return
+
+        seen_u, seen_v = set([u]), set([v])
+        search_u, search_v = self._search(u, seen_u), self._search(v, seen_v)
+        done = object()
+        while True:
+            for search, seen, other in ((search_u, seen_u, seen_v), (search_v, seen_v, seen_u)):
+                x = next(search, done)
+                if x is done:  # nothing more to reach, so split off what was
+                    self._split(seen)
+                    return
+                if x in other:  # met the other search, still connected
+                    return
+
+    def _search(self, start, seen):
+        """Breadth-first search from start, yielding each new node reached."""
+        adj = self.adj
+        queue = deque([start])
+        while queue:
+            for y in adj[queue.popleft()]:
+                if y not in seen:
+                    seen.add(y)
+                    yield y
+                    queue.append(y)
+
+    def _new_component(self, nodes):
+        """Label a set of nodes as a component of their own."""
+        label = self._label
+        self._label += 1
+        self.members[label] = nodes
+        for x in nodes:
+            self.component[x] = label
+        self._resize(None, len(nodes))
+
+    def _split(self, nodes):
+        """Move a set of nodes out of their component, into a new one."""
+        old = self.members[self.component[next(iter(nodes))]]
+        self._resize(len(old), len(old) - len(nodes))
+        old -= nodes
+        self._new_component(nodes)
+
+    def _remove_node(self, x):
+        """Take a node out of its component, forgetting the component once empty."""
+        label = self.component.pop(x)
+        old = self.members[label]
+        self._resize(len(old), len(old) - 1)
+        old.discard(x)
+        if not old:
+            del self.members[label]
+
+    def _resize(self, old, new):
+        """Move a component from one size to another (None for no component)."""
+        sizes = self.sizes
+        if old:
+            if sizes[old] == 1:
+                del sizes[old]
+            else:
+                sizes[old] -= 1
+        if new:
+            sizes[new] = sizes.get(new, 0) + 1
+
+
+class RollingWindow(object):
+
+    def __init__(self, window=60., graph=True, histogram=False, lateness=None,
+                 components=False):
+        """
+        Defines an (empty) rolling window over a stream of tweets.
+
+        Parameters
+        ----------
+        window : integer, float
+            rolling window size, in the same units as the tweet times
+            that will be pushed (e.g. seconds, or nanoseconds).
+        graph : bool
+            whether to maintain the window's NetworkX graph. Without it,
+            only edge counts and degree statistics are kept.
+        histogram : bool
+            whether to maintain a degree histogram, {degree: no. of nodes}.
+        lateness : integer, float, optional
+            how far behind 'now' a late tweet may be and still be counted.
+            Defaults to (and is capped at) the window size.
+        components : bool
+            whether to keep track of the window graph's connected components
+            (see Components), e.g. for their number and the largest one's size.
+
+        Returns
+        -------
+        self
+            a window object, holding the co-occurrence graph of all
+            tweets received within [window] of the most recent one.
+        """
+
+        self.window = window
+        self.lateness = window if lateness is None else min(lateness, window)
+        self.now = None  # most recent timestamp received, i.e. 'what time it is'
+        self.n_events = 0  # number of tweets pushed
+        self.n_late = 0  # ...that arrived after a later tweet
+        self.n_dropped = 0  # ...that were too late to be counted
+        self.n_evicted = 0  # ...that have since fallen out of the window
+        self.version = 0  # bumped whenever a tweet enters or leaves the window
+        self.stamp = None  # stamp of the tweet that set 'now'
+        self.graph = None  # live window graph
+        self.changes = None  # list to log each change to the graph to, if any
+        if graph:
+            import networkx as nx  # only imported when graphs are wanted
+            self.graph = nx.Graph(time=None)
+        self.edge_count = {}  # edge --> number of tweets in window containing it
+        self.degree = {}  # hashtag --> degree, for all nodes in the window
+        self.degree_sum = 0  # sum of all node degrees, i.e. twice the edges
+        self.histogram = {} if histogram else None  # degree --> no. of nodes
+        self.components = Components() if components else None
+        self.sketch = None  # e.g. a Trending sketch, fed every tweet with a hashtag that enters
+        self.node_seen = {}  # hashtag --> {tweet no.: stamp}, in graph mode only
+        self._node_last = {}  # hashtag --> latest tweet no. in window containing it
+        self._heap = []  # (time, tweet no., tags, stamp) of tweets in window
+        self._seq = 0  # next tweet no., when not given explicitly
+
+    def __len__(self):
+        """Number of tweets currently held in the window."""
+        return len(self._heap)
+
+    @property
+    def n_nodes(self):
+        """Number of hashtags (nodes) in the window graph."""
+        return len(self.degree)
+
+    @property
+    def n_edges(self):
+        """Number of distinct co-occurrences (edges) in the window graph."""
+        return len(self.edge_count)
+
+    def mean_degree(self):
+        """Mean degree of the window graph, in constant time."""
+        if not self.degree:
+            return float('nan')
+        return self.degree_sum / float(len(self.degree))
+
+    def advance(self, time, stamp=None):
+        """
+        Move 'now' forward to [time] (never backward), and evict all tweets
+        that are no longer within [window] of it.
+
+        Parameters
+        ----------
+        time : integer, float
+            timestamp of the most recently received tweet
+        stamp : object, optional
+            value stored as the graph's 'time' attribute (defaults to time)
+        """
+        if self.now is None or time > self.now:  # update 'what time it is'
+            self.now = time
+            self.stamp = time if stamp is None else stamp
+            if self.graph is not None:
+                self.graph.graph['time'] = self.stamp
+                if self.changes is not None:
+                    self.changes.append((SET_TIME, self.stamp))
+        if self.sketch is not None and self.sketch.advance(self.now):
+            self.version += 1
+
+        cutoff = self.now - self.window
+        heap = self._heap
+        while heap and heap[0][0] < cutoff:  # oldest tweet fell out of the window
+            _, seq, tags, _ = heappop(heap)
+            self._remove(seq, tags)
+            self.n_evicted += 1
+            self.version += 1
+
+    def push(self, time, tags, stamp=None, seq=None):
+        """
+        Receive a single tweet, advancing 'now' if it is the latest one seen.
+
+        Parameters
+        ----------
+        time : integer, float
+            timestamp of the tweet
+        tags : list
+            hashtags in the tweet
+        stamp : object, optional
+            value stored as the 'time' attribute of the tweet's nodes (and of
+            the graph, if the tweet advances 'now'). Defaults to time.
+        seq : integer, optional
+            tweet number (order of arrival). Defaults to counting pushes.
+
+        Returns
+        -------
+        bool
+            whether the tweet entered the window. Tweets with fewer than two
+            hashtags have no co-occurrences and are never stored (though the
+            .sketch, if any, counts their hashtag), and late tweets beyond the
+            allowed lateness are dropped.
+
+        Notes
+        -----
+        As with nx.compose(), each node takes the stamp of the most recently
+        received (i.e. highest tweet number) tweet in the window containing it.
+        """
+        self.n_events += 1
+        self.advance(time, stamp)
+        if time < self.now:
+            self.n_late += 1
+            if time < self.now - self.lateness:
+                self.n_dropped += 1
+                return False
+        return self.insert(time, tags, stamp, seq)
+
+    def insert(self, time, tags, stamp=None, seq=None):
+        """
+        Add a tweet to the window without treating it as a new event, i.e.
+        without moving 'now' or counting it as late. Useful to warm up a
+        window with tweets received earlier. Takes the same parameters as,
+        and returns, push().
+        """
+        if seq is None:
+            seq = self._seq
+        self._seq = max(self._seq, seq + 1)
+        if stamp is None:
+            stamp = time
+
+        if self.now is not None and time < self.now - self.window:
+            return False
+        if self.sketch is not None and len(tags):  # counts every hashtag, paired or not
+            self.sketch.insert(time, tags)
+            self.version += 1
+        if len(tags) < 2:
+            return False
+
+        heappush(self._heap, (time, seq, tags, stamp))
+        self._add(seq, tags, stamp)
+        self.version += 1
+        return True
+
+    def snapshot(self):
+        """
+        Independent copy of the current window graph, safe to keep around
+        after the window moves on.
+
+        Returns
+        -------
+        NetworkX graph
+            composition graph on all hashtags in the window
+        """
+        import networkx as nx
+        G = nx.Graph(time=self.graph.graph['time'])
+        G.add_nodes_from(self.graph.nodes(data=True))
+        G.add_edges_from(self.graph.edges())
+        return G
+
+    def _shift_degree(self, tag, change):
+        """Change a node's degree, dropping the node once it reaches zero."""
+        old = self.degree.get(tag, 0)
+        new = old + change
+        if new:
+            self.degree[tag] = new
+        else:
+            del self.degree[tag]
+        self.degree_sum += change
+
+        hist = self.histogram
+        if hist is not None:
+            if old:
+                if hist[old] == 1:
+                    del hist[old]
+                else:
+                    hist[old] -= 1
+            if new:
+                hist[new] = hist.get(new, 0) + 1
+
+    def _add(self, seq, tags, stamp):
+        """Add the complete k-graph of a tweet entering the window."""
+        graph, comps, log = self.graph, self.components, self.changes
+        if graph is not None:
+            for tag in tags:
+                seen = self.node_seen.get(tag)
+                if seen is None:
+                    seen = self.node_seen[tag] = {}
+                seen[seq] = stamp
+                if seq >= self._node_last.get(tag, seq):  # latest tweet with tag
+                    self._node_last[tag] = seq
+                    graph.add_node(tag, time=stamp)
+                    if log is not None:
+                        log.append((ADD_NODE, tag, stamp))
+
+        edge_count = self.edge_count
+        for u, v in combinations(tags, 2):
+            e = _edge(u, v)
+            n = edge_count.get(e, 0)
+            if not n:  # edge is new to the window
+                if u == v:  # self-loops count twice, as in NetworkX
+                    self._shift_degree(u, 2)
+                else:
+                    self._shift_degree(u, 1)
+                    self._shift_degree(v, 1)
+                if graph is not None:
+                    graph.add_edge(u, v)
+                    if log is not None:
+                        log.append((ADD_EDGE, u, v))
+                if comps is not None:
+                    comps.add_edge(u, v)
+            edge_count[e] = n + 1
+
+    def _remove(self, seq, tags):
+        """Remove the complete k-graph of a tweet leaving the window."""
+        graph, comps, log = self.graph, self.components, self.changes
+        edge_count = self.edge_count
+        for u, v in combinations(tags, 2):
+            e = _edge(u, v)
+            n = edge_count[e] - 1
+            if n:
+                edge_count[e] = n
+            else:  # no other tweet in the window has this edge
+                del edge_count[e]
+                if u == v:
+                    self._shift_degree(u, -2)
+                else:
+                    self._shift_degree(u, -1)
+                    self._shift_degree(v, -1)
+                if graph is not None:
+                    graph.remove_edge(u, v)
+                    if log is not None:
+                        log.append((REMOVE_EDGE, u, v))
+                if comps is not None:
+                    comps.remove_edge(u, v)
+
+        if graph is None:
+            return
+        for tag in tags:
+            seen = self.node_seen.get(tag)
+            if seen is None:  # repeated hashtag, already removed
+                continue
+            seen.pop(seq, None)
+            if not seen:  # no other tweet in the window has this hashtag
+                del self.node_seen[tag]
+                del self._node_last[tag]
+                graph.remove_node(tag)
+                if log is not None:
+                    log.append((REMOVE_NODE, tag))
+            elif self._node_last[tag] == seq:  # fall back to next-latest tweet
+                last = max(seen)
+                self._node_last[tag] = last
+                graph.add_node(tag, time=seen[last])
+                if log is not None:
+                    log.append((ADD_NODE, tag, seen[last]))
+
+
+class BucketedWindow(RollingWindow):
+
+    def __init__(self, window=3600., bucket=60., histogram=False, lateness=None,
+                 components=False):
+        """
+        Defines an (empty) rolling window, which aggregates its tweets into
+        fixed time buckets rather than keeping each of them.
+
+        Parameters
+        ----------
+        window : integer, float
+            rolling window size, in the same units as the tweet times
+            that will be pushed (e.g. seconds, or nanoseconds).
+        bucket : integer, float
+            width of each bucket, in the same units (e.g. a minute, for a
+            day-long window).
+        histogram, lateness, components :
+            as for RollingWindow.
+
+        Returns
+        -------
+        self
+            a window object, with the same degree statistics as a RollingWindow
+            (but no NetworkX graph), over all buckets within [window] of the
+            most recent tweet.
+
+        Notes
+        -----
+        Bucket k holds the tweets with times in [k*bucket, (k+1)*bucket), and
+        only expires once all of it is older than the window. So the window
+        always holds every tweet within [window] of 'now', plus any tweets
+        sharing a bucket with the oldest of them: up to one bucket's width
+        more than a RollingWindow would. Likewise, a late tweet is counted as
+        long as its bucket has not expired (and it is within the lateness).
+        """
+        super(BucketedWindow, self).__init__(window, graph=False, histogram=histogram,
+                                             lateness=lateness, components=components)
+        self.bucket = bucket
+        self.n_tweets = 0  # number of tweets held in the buckets
+        self._buckets = {}  # index --> [no. of tweets, {edge: count}], for live buckets
+        self._oldest = None  # index of the oldest bucket that may be in the window
+
+    def __len__(self):
+        """Number of tweets currently held in the window."""
+        return self.n_tweets
+
+    def advance(self, time, stamp=None):
+        """
+        Move 'now' forward to [time] (never backward), and expire all buckets
+        that are entirely older than [window] before it.
+        """
+        if self.now is None or time > self.now:
+            self.now = time
+            self.stamp = time if stamp is None else stamp
+        if self.sketch is not None and self.sketch.advance(self.now):
+            self.version += 1
+
+        oldest = int((self.now - self.window) // self.bucket)
+        if self._oldest is None:
+            self._oldest = oldest
+        if oldest <= self._oldest:
+            return
+
+        buckets = self._buckets
+        if oldest - self._oldest > len(buckets):  # big jump, check the few buckets kept
+            expired = [k for k in buckets if k < oldest]
+        else:
+            expired = [k for k in xrange(self._oldest, oldest) if k in buckets]
+        for k in expired:
+            self._expire(buckets.pop(k))
+        self._oldest = oldest
+
+    def insert(self, time, tags, stamp=None, seq=None):
+        """
+        Add a tweet to its bucket, without treating it as a new event. Unlike
+        RollingWindow, a tweet ahead of 'now' moves it forward, since the
+        buckets are kept relative to 'now'. See RollingWindow.insert().
+        """
+        if self.now is None or time > self.now:
+            self.advance(time, stamp)
+        k = int(time // self.bucket)
+        if k < self._oldest:  # its bucket already expired
+            return False
+        if self.sketch is not None and len(tags):  # counts every hashtag, paired or not
+            self.sketch.insert(time, tags)
+            self.version += 1
+        if len(tags) < 2:
+            return False
+
+        bucket = self._buckets.get(k)
+        if bucket is None:
+            bucket = self._buckets[k] = [0, {}]
+        bucket[0] += 1
+        self.n_tweets += 1
+
+        counts = bucket[1]
+        edge_count, comps = self.edge_count, self.components
+        for u, v in combinations(tags, 2):
+            e = _edge(u, v)
+            counts[e] = counts.get(e, 0) + 1
+            n = edge_count.get(e, 0)
+            if not n:  # edge is new to the window
+                if u == v:  # self-loops count twice, as in NetworkX
+                    self._shift_degree(u, 2)
+                else:
+                    self._shift_degree(u, 1)
+                    self._shift_degree(v, 1)
+                if comps is not None:
+                    comps.add_edge(u, v)
+            edge_count[e] = n + 1
+        self.version += 1
+        return True
+
+    def _expire(self, bucket):
+        """Remove all of a bucket's edge counts from the window at once."""
+        edge_count, comps = self.edge_count, self.components
+        for e, c in bucket[1].iteritems():
+            n = edge_count[e] - c
+            if n:
+                edge_count[e] = n
+            else:  # no other bucket has this edge
+                del edge_count[e]
+                u, v = e
+                if u == v:
+                    self._shift_degree(u, -2)
+                else:
+                    self._shift_degree(u, -1)
+                    self._shift_degree(v, -1)
+                if comps is not None:
+                    comps.remove_edge(u, v)
+        self.n_tweets -= bucket[0]
+        self.n_evicted += bucket[0]
+        self.version += 1
+
+
+def _widest(name):
+    """Property of a WindowSet, taken from its widest window."""
+    return property(lambda self: getattr(self.widest, name))
+
+
+class WindowSet(object):
+
+    def __init__(self, windows, graph=True, histogram=False, lateness=None, bucket=None,
+                 components=False):
+        """
+        Defines a set of rolling windows of different sizes over the same
+        stream of tweets, which are all updated in one pass.
+
+        Parameters
+        ----------
+        windows : list of integers, floats
+            rolling window sizes (see RollingWindow).
+        graph, histogram, lateness, components :
+            as for RollingWindow, for each of the windows (lateness is capped
+            at each window's size).
+        bucket : integer, float, optional
+            make each window a BucketedWindow, with buckets of this width.
+
+        Returns
+        -------
+        self
+            a window set, which can be pushed tweets just like a single
+            RollingWindow. Its size, 'now' and counts of evicted/late/dropped
+            tweets are those of the widest window.
+        """
+        if bucket is None:
+            self.windows = [RollingWindow(w, graph=graph, histogram=histogram,
+                                          lateness=lateness, components=components)
+                            for w in windows]
+        else:
+            self.windows = [BucketedWindow(w, bucket, histogram=histogram,
+                                           lateness=lateness, components=components)
+                            for w in windows]
+        self.widest = max(self.windows, key=lambda rw: rw.window)
+
+    def __len__(self):
+        return len(self.widest)
+
+    def __iter__(self):
+        return iter(self.windows)
+
+    def __getitem__(self, i):
+        return self.windows[i]
+
+    now = _widest('now')
+    stamp = _widest('stamp')
+    n_nodes = _widest('n_nodes')
+    n_edges = _widest('n_edges')
+    n_events = _widest('n_events')
+    n_late = _widest('n_late')
+    n_dropped = _widest('n_dropped')
+    n_evicted = _widest('n_evicted')
+
+    @property
+    def version(self):
+        """Changes whenever the contents of any of the windows do."""
+        return sum(rw.version for rw in self.windows)
+
+    def advance(self, time, stamp=None):
+        for rw in self.windows:
+            rw.advance(time, stamp)
+
+    def push(self, time, tags, stamp=None, seq=None):
+        """Push a tweet to every window, returning whether any of them kept it."""
+        kept = [rw.push(time, tags, stamp, seq) for rw in self.windows]
+        return any(kept)
+
+    def insert(self, time, tags, stamp=None, seq=None):
+        kept = [rw.insert(time, tags, stamp, seq) for rw in self.windows]
+        return any(kept)
+
+    def stats(self, funcs):
+        """
+        Row of statistics, with a column per function and window (windows
+        vary fastest), and NaN for windows with fewer than 2 hashtags.
+        """
+        return [f(rw) if rw.n_nodes > 1 else float('nan')
+                for f in funcs for rw in self.windows]